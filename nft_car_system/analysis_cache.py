@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Analysis Cache
+Size-bounded in-memory LRU in front of a SQLite tier shared by all workers,
+versioned by model identity so a model swap invalidates stale entries
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def content_fingerprint(data: bytes) -> str:
+    """Stable key for raw image bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class AnalysisCache:
+    """Two-tier cache of JSON-serialisable analysis results"""
+
+    def __init__(self, version: str, db_path: Optional[str] = 'analysis_cache.sqlite3',
+                 max_items: int = 1024):
+        self.version = version
+        self.db_path = db_path
+        self.max_items = max(0, max_items)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        if self.db_path:
+            conn = self._connection()
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_cache (
+                    key TEXT PRIMARY KEY,
+                    version TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            # Entries written by another model version can never be served again
+            conn.execute("DELETE FROM analysis_cache WHERE version != ?", (self.version,))
+            conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _key(self, namespace: str, key: str) -> str:
+        return hashlib.sha256(f"{self.version}\0{namespace}\0{key}".encode()).hexdigest()
+
+    def _remember(self, cache_key: str, value: Any):
+        if self.max_items == 0:
+            return
+        with self._lock:
+            self._memory[cache_key] = value
+            self._memory.move_to_end(cache_key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Look up memory first, then disk (promoting disk hits into memory)"""
+        cache_key = self._key(namespace, key)
+        with self._lock:
+            if cache_key in self._memory:
+                self._memory.move_to_end(cache_key)
+                self._counters["memory_hits"] += 1
+                return self._memory[cache_key]
+        if self.db_path:
+            try:
+                row = self._connection().execute(
+                    "SELECT value FROM analysis_cache WHERE key = ? AND version = ?",
+                    (cache_key, self.version)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"⚠️ Analysis cache read failed: {e}")
+                row = None
+            if row is not None:
+                value = json.loads(row[0])
+                self._remember(cache_key, value)
+                with self._lock:
+                    self._counters["disk_hits"] += 1
+                return value
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def put(self, namespace: str, key: str, value: Any):
+        """Store a result in both tiers"""
+        cache_key = self._key(namespace, key)
+        self._remember(cache_key, value)
+        if self.db_path:
+            try:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (key, version, value, created_at) VALUES (?, ?, ?, ?)",
+                    (cache_key, self.version, json.dumps(value), time.time())
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Analysis cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit counters per tier"""
+        with self._lock:
+            lookups = sum(self._counters.values())
+            hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+            return {
+                "version": self.version,
+                "memory_items": len(self._memory),
+                "max_items": self.max_items,
+                **self._counters,
+                "hit_ratio": hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Benchmark assisted (speculative) decoding for the car chat model
+Generates answers to the questions in car_chat_llm_dataset.csv with and without
+a draft model and reports tokens/sec and how many drafted tokens the chat model
+accepted. Greedy outputs must match exactly, which checks the verification step.
+
+Usage: python benchmark_assisted_decoding.py --draft ./simple_car_chat_draft_model
+"""
+
+import argparse
+import csv
+import json
+import time
+
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+
+import ml_api_service as service
+from car_catalog import CarCatalog
+
+DATASET_PATH = 'car_chat_llm_dataset.csv'
+
+
+def load_questions(path: str = DATASET_PATH, limit: int = 20):
+    """Distinct user questions from the chat training dataset, in file order"""
+    questions = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            first_line = row['text'].strip().split('\n', 1)[0]
+            if first_line.startswith('User:'):
+                question = first_line[len('User:'):].strip()
+                if question and question not in questions:
+                    questions.append(question)
+    return questions[:limit]
+
+
+class ForwardCounter:
+    """Count forward passes of a model through a forward hook"""
+
+    def __init__(self, model):
+        self.calls = 0
+        self._handle = model.register_forward_hook(self._count)
+
+    def _count(self, module, inputs, outputs):
+        self.calls += 1
+
+    def reset(self):
+        self.calls = 0
+
+    def remove(self):
+        self._handle.remove()
+
+
+def generate(model, tokenizer, inputs, max_new_tokens: int, do_sample: bool, seed: int, draft=None):
+    """One generate call as the service makes it; returns (new_ids, seconds)"""
+    torch.manual_seed(seed)
+    started = time.perf_counter()
+    with torch.no_grad():
+        outputs = model.generate(
+            inputs,
+            attention_mask=torch.ones_like(inputs),
+            assistant_model=draft,
+            max_new_tokens=max_new_tokens,
+            temperature=0.7 if do_sample else None,
+            do_sample=do_sample,
+            pad_token_id=tokenizer.eos_token_id,
+            eos_token_id=tokenizer.eos_token_id
+        )
+    return outputs[0, inputs.shape[1]:], time.perf_counter() - started
+
+
+def benchmark_assisted_decoding(draft_path: str, num_questions: int = 20, num_cars: int = 5,
+                                max_new_tokens: int = 100, num_assistant_tokens: int = 5) -> dict:
+    """Compare plain sampling against draft-assisted sampling on the same prompts"""
+    print("🚗 Loading car chat and draft models...")
+    tokenizer = AutoTokenizer.from_pretrained(service.CAR_CHAT_MODEL_PATH)
+    model = AutoModelForCausalLM.from_pretrained(service.CAR_CHAT_MODEL_PATH).eval()
+    draft_tokenizer = AutoTokenizer.from_pretrained(draft_path)
+    if draft_tokenizer.get_vocab() != tokenizer.get_vocab():
+        raise SystemExit("❌ The draft model must share the chat model's vocabulary")
+    draft = AutoModelForCausalLM.from_pretrained(draft_path).eval()
+    draft.generation_config.num_assistant_tokens = num_assistant_tokens
+
+    catalog = CarCatalog()
+    catalog.load()
+    cars = catalog.records()[:num_cars]
+    questions = load_questions(limit=num_questions)
+    prompts = []
+    for record in cars:
+        for question in questions:
+            prefix, suffix = service.build_chat_prompt(question, record.to_info())
+            prompts.append(tokenizer.encode(prefix + suffix, return_tensors="pt"))
+    print(f"📋 {len(prompts)} prompts ({len(cars)} cars x {len(questions)} questions)")
+
+    target_calls = ForwardCounter(model)
+    draft_calls = ForwardCounter(draft)
+    totals = {"plain_tokens": 0, "plain_s": 0.0, "assisted_tokens": 0, "assisted_s": 0.0,
+              "target_forwards": 0, "drafted": 0, "accepted": 0, "greedy_matches": 0}
+    try:
+        # Warm both paths so first-call kernel setup is not measured
+        generate(model, tokenizer, prompts[0], 4, True, 0)
+        generate(model, tokenizer, prompts[0], 4, True, 0, draft)
+
+        for seed, inputs in enumerate(prompts):
+            new_ids, elapsed = generate(model, tokenizer, inputs, max_new_tokens, True, seed)
+            totals["plain_tokens"] += len(new_ids)
+            totals["plain_s"] += elapsed
+
+            target_calls.reset()
+            draft_calls.reset()
+            new_ids, elapsed = generate(model, tokenizer, inputs, max_new_tokens, True, seed, draft)
+            totals["assisted_tokens"] += len(new_ids)
+            totals["assisted_s"] += elapsed
+            # Every verification pass yields the accepted draft tokens plus one of its own
+            totals["target_forwards"] += target_calls.calls
+            totals["drafted"] += draft_calls.calls
+            totals["accepted"] += max(0, len(new_ids) - target_calls.calls)
+
+            # Greedy decoding is deterministic, so assisted output must be identical
+            plain, _ = generate(model, tokenizer, inputs, max_new_tokens, False, seed)
+            assisted, _ = generate(model, tokenizer, inputs, max_new_tokens, False, seed, draft)
+            totals["greedy_matches"] += int(torch.equal(plain, assisted))
+    finally:
+        target_calls.remove()
+        draft_calls.remove()
+
+    plain_tps = totals["plain_tokens"] / totals["plain_s"]
+    assisted_tps = totals["assisted_tokens"] / totals["assisted_s"]
+    return {
+        "draft_model": draft_path,
+        "num_assistant_tokens": num_assistant_tokens,
+        "prompts": len(prompts),
+        "max_new_tokens": max_new_tokens,
+        "plain_tokens_per_s": plain_tps,
+        "assisted_tokens_per_s": assisted_tps,
+        "speedup": assisted_tps / plain_tps,
+        "acceptance_rate": totals["accepted"] / totals["drafted"] if totals["drafted"] else 0.0,
+        "tokens_per_target_forward": (totals["assisted_tokens"] / totals["target_forwards"]
+                                      if totals["target_forwards"] else 0.0),
+        "greedy_match_rate": totals["greedy_matches"] / len(prompts)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark draft-model assisted decoding for car chat")
+    parser.add_argument('--draft', default=service.CHAT_DRAFT_MODEL_PATH, required=not service.CHAT_DRAFT_MODEL_PATH,
+                        help="Draft model path (default: CHAT_DRAFT_MODEL_PATH)")
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--cars', type=int, default=5)
+    parser.add_argument('--max-new-tokens', type=int, default=service.CHAT_MAX_NEW_TOKENS)
+    parser.add_argument('--num-assistant-tokens', type=int, default=service.CHAT_NUM_ASSISTANT_TOKENS)
+    parser.add_argument('--output', help="Write the results as JSON")
+    args = parser.parse_args()
+
+    result = benchmark_assisted_decoding(args.draft, args.questions, args.cars,
+                                         args.max_new_tokens, args.num_assistant_tokens)
+    print("\n" + "=" * 50)
+    print("🏎️  ASSISTED DECODING")
+    print("=" * 50)
+    print(f"📊 {result['prompts']} prompts, draft {result['draft_model']} "
+          f"({result['num_assistant_tokens']} tokens per step)")
+    print(f"  plain     {result['plain_tokens_per_s']:8.1f} tokens/s")
+    print(f"  assisted  {result['assisted_tokens_per_s']:8.1f} tokens/s  ({result['speedup']:.2f}x)")
+    print(f"✅ Acceptance rate {result['acceptance_rate']:.1%}, "
+          f"{result['tokens_per_target_forward']:.2f} tokens per chat-model forward")
+    print(f"🎯 Greedy outputs identical on {result['greedy_match_rate']:.1%} of prompts")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark chat throughput under concurrent load through the service path: the
+inference executor, prompt encoding with the prefix KV cache, and either one
+generate() per request on a worker or the continuous batch awaited on the event loop
+"""
+
+import argparse
+import asyncio
+import time
+
+import ml_api_service as service
+from car_catalog import CarCatalog
+from inference_executor import ExecutorSaturated
+
+QUESTIONS = [
+    "Tell me about this car",
+    "What year is this car from?",
+    "Who manufactured this car?",
+    "What makes this model special?"
+]
+
+
+async def run_level(items, concurrency: int, max_new_tokens: int):
+    """Returns (generated tokens, seconds, rejected) for all items with concurrency requests in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(item):
+        user_message, car_info = item
+        async with semaphore:
+            try:
+                reply = await service.run_inference(service.generate_car_chat_reply, user_message, car_info, None,
+                                                    service.generation_budget(max_new_tokens), defer=True)
+            except ExecutorSaturated:
+                return None
+            return reply.new_tokens
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(item) for item in items))
+    tokens = sum(result for result in results if result is not None)
+    return tokens, time.perf_counter() - started, sum(1 for result in results if result is None)
+
+
+async def benchmark_chat_batching(levels=(1, 2, 4, 8), requests_per_level: int = 16, max_new_tokens: int = 64):
+    print("🚗 Loading car chat model...")
+    service.load_chat_model()
+    engine = service.car_chat_engine
+    if engine is None:
+        raise SystemExit("❌ Continuous batching is off (CHAT_ENGINE_MAX_BATCH=0 or a draft model is set)")
+
+    catalog = CarCatalog()
+    catalog.load()
+    cars = catalog.records()
+    items = [(QUESTIONS[i % len(QUESTIONS)], cars[i % len(cars)].to_info()) for i in range(requests_per_level)]
+
+    # No analysis cache is configured here, so every request generates
+    await run_level(items[:1], 1, max_new_tokens)
+
+    print("\n" + "=" * 50)
+    print(f"🚦 CHAT THROUGHPUT (tokens/s, {service.inference_executor.max_workers} inference workers)")
+    print("=" * 50)
+    for concurrency in levels:
+        service.car_chat_engine = None
+        plain_tokens, plain_s, plain_rejected = await run_level(items, concurrency, max_new_tokens)
+        service.car_chat_engine = engine
+        batched_tokens, batched_s, batched_rejected = await run_level(items, concurrency, max_new_tokens)
+        plain_tps, batched_tps = plain_tokens / plain_s, batched_tokens / batched_s
+        print(f"  {concurrency:2} concurrent  generate() {plain_tps:8.1f}  |  continuous batch {batched_tps:8.1f}"
+              f"  ({batched_tps / plain_tps:.2f}x)  rejected {plain_rejected}/{batched_rejected}")
+    print(f"🗂️  Engine: {engine.stats()}")
+    engine.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-request generate() with continuous batching")
+    parser.add_argument('--levels', default='1,2,4,8', help="Comma-separated concurrency levels")
+    parser.add_argument('--requests', type=int, default=16, help="Requests per level")
+    parser.add_argument('--max-new-tokens', type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(benchmark_chat_batching(tuple(int(level) for level in args.levels.split(',')), args.requests,
+                                        args.max_new_tokens))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark time-to-first-token for car chat with and without the prefix KV cache
+"""
+
+import statistics
+import time
+
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+
+import ml_api_service as service
+from car_catalog import CarCatalog
+
+QUESTIONS = [
+    "Tell me about this car",
+    "What year is this car from?",
+    "Who manufactured this car?",
+    "What makes this model special?",
+    "What color is this car?"
+]
+
+
+def time_to_first_token(encode) -> float:
+    """Seconds from prompt encoding until generate() has produced one new token"""
+    started = time.perf_counter()
+    inputs, past_key_values = encode()
+    with torch.no_grad():
+        service.car_chat_model.generate(
+            inputs,
+            attention_mask=torch.ones_like(inputs),
+            past_key_values=past_key_values,
+            max_new_tokens=1,
+            do_sample=False,
+            pad_token_id=service.car_chat_tokenizer.eos_token_id
+        )
+    return time.perf_counter() - started
+
+
+def benchmark_prefix_cache(num_cars: int = 10):
+    """Compare cold full-prompt encoding against cached-prefix encoding"""
+    print("🚗 Loading car chat model...")
+    service.car_chat_tokenizer = AutoTokenizer.from_pretrained(service.CAR_CHAT_MODEL_PATH)
+    service.car_chat_model = AutoModelForCausalLM.from_pretrained(service.CAR_CHAT_MODEL_PATH)
+    service.car_chat_model.eval()
+    service.models_version = service.model_identity()
+
+    catalog = CarCatalog()
+    catalog.load()
+    cars = catalog.records()[:num_cars]
+
+    baseline, cached = [], []
+    for record in cars:
+        car_info = record.to_info()
+        for question in QUESTIONS:
+            prefix, suffix = service.build_chat_prompt(question, car_info)
+
+            # Baseline: encode the whole prompt from scratch
+            baseline.append(time_to_first_token(
+                lambda: (service.car_chat_tokenizer.encode(prefix + suffix, return_tensors="pt"), None)
+            ))
+
+            # Cached: only the question suffix is encoded once the car prefix is warm
+            service.encode_chat_prompt(prefix, suffix, record.uuid)
+            cached.append(time_to_first_token(
+                lambda: service.encode_chat_prompt(prefix, suffix, record.uuid)
+            ))
+
+    def summary(samples):
+        ordered = sorted(samples)
+        return {
+            "mean_ms": 1000 * statistics.mean(ordered),
+            "p50_ms": 1000 * ordered[len(ordered) // 2],
+            "p95_ms": 1000 * ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        }
+
+    base, warm = summary(baseline), summary(cached)
+    print("\n" + "=" * 50)
+    print("⏱️  TIME TO FIRST TOKEN")
+    print("=" * 50)
+    print(f"📊 Samples: {len(baseline)} ({len(cars)} cars x {len(QUESTIONS)} questions)")
+    for name in ("mean_ms", "p50_ms", "p95_ms"):
+        print(f"  {name:8} full prompt {base[name]:8.1f}  |  cached prefix {warm[name]:8.1f}")
+    print(f"🚀 Mean speedup: {base['mean_ms'] / warm['mean_ms']:.2f}x")
+    print(f"🗂️  Cache: {service.prefix_kv_cache.stats()}")
+
+
+if __name__ == "__main__":
+    benchmark_prefix_cache()
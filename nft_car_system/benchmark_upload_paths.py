@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Compare the base64 JSON path against the multipart upload path for /analyze-nft
+Measures peak Python heap and latency of the ingest + decode stage in-process,
+and optionally end-to-end latency against a running service
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from PIL import Image
+
+SPOOL_MAX_BYTES = 1024 * 1024
+
+
+def base64_ingest(image_bytes: bytes):
+    """What /analyze-nft does: JSON body -> base64 string -> bytes -> PIL"""
+    body = json.dumps({"image_base64": base64.b64encode(image_bytes).decode('utf-8')})
+    payload = json.loads(body)
+    image_data = base64.b64decode(payload["image_base64"])
+    hashlib.sha256(image_data).hexdigest()
+    image = Image.open(io.BytesIO(image_data))
+    image.load()
+    return image.size
+
+
+def multipart_ingest(image_bytes: bytes):
+    """What /analyze-nft/upload does: spooled file -> chunked hash -> PIL reads the file"""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    view = memoryview(image_bytes)
+    for start in range(0, len(view), SPOOL_MAX_BYTES):
+        spool.write(view[start:start + SPOOL_MAX_BYTES])
+    spool.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: spool.read(SPOOL_MAX_BYTES), b''):
+        digest.update(chunk)
+    spool.seek(0)
+    image = Image.open(spool)
+    image.load()
+    spool.close()
+    return image.size
+
+
+def measure(fn, image_bytes: bytes, runs: int):
+    """Return (median latency ms, peak traced heap MB)"""
+    latencies = []
+    peak = 0
+    for _ in range(runs):
+        tracemalloc.start()
+        started = time.perf_counter()
+        fn(image_bytes)
+        latencies.append(1000 * (time.perf_counter() - started))
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return statistics.median(latencies), peak / (1024 * 1024)
+
+
+def end_to_end(url: str, image_path: str, runs: int):
+    """Median end-to-end latency of both endpoints against a running service"""
+    import requests
+
+    with open(image_path, "rb") as f:
+        image_bytes = f.read()
+    fields = {
+        "token_id": "upload_benchmark",
+        "collection_address": "0x1c6d27a76f4f706cccb698acc236c31f886c5421",
+        "user_message": "Tell me about this car"
+    }
+    json_times, multipart_times = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        requests.post(f"{url}/analyze-nft", timeout=120, json={
+            **fields, "image_base64": base64.b64encode(image_bytes).decode('utf-8')
+        }).raise_for_status()
+        json_times.append(1000 * (time.perf_counter() - started))
+
+        started = time.perf_counter()
+        requests.post(f"{url}/analyze-nft/upload", timeout=120, data=fields,
+                      files={"image": (image_path, image_bytes)}).raise_for_status()
+        multipart_times.append(1000 * (time.perf_counter() - started))
+    return statistics.median(json_times), statistics.median(multipart_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare base64 and multipart ingest paths")
+    parser.add_argument('image', help="Path to a test image (e.g. a catalog TIFF)")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--url', help="Also time both endpoints on a running service, e.g. http://localhost:8000")
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        image_bytes = f.read()
+
+    print(f"🖼️  Image: {args.image} ({len(image_bytes) / (1024 * 1024):.1f} MB)")
+    print(f"📦 Base64 payload: {len(base64.b64encode(image_bytes)) / (1024 * 1024):.1f} MB")
+
+    b64_ms, b64_mb = measure(base64_ingest, image_bytes, args.runs)
+    mp_ms, mp_mb = measure(multipart_ingest, image_bytes, args.runs)
+
+    print("\n" + "=" * 50)
+    print("📊 INGEST + DECODE (in-process)")
+    print("=" * 50)
+    print(f"  base64 JSON : {b64_ms:8.1f} ms  peak heap {b64_mb:8.1f} MB")
+    print(f"  multipart   : {mp_ms:8.1f} ms  peak heap {mp_mb:8.1f} MB")
+
+    if args.url:
+        json_ms, multipart_ms = end_to_end(args.url, args.image, args.runs)
+        print("\n" + "=" * 50)
+        print("🌐 END TO END")
+        print("=" * 50)
+        print(f"  /analyze-nft        : {json_ms:8.1f} ms")
+        print(f"  /analyze-nft/upload : {multipart_ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
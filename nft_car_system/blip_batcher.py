@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Dynamic Micro-Batching for BLIP Captioning
+Collects pending images for up to N items or T milliseconds, runs one padded
+generate call and fans the captions back out to the waiting callers
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Dict, Any
+
+import torch
+from PIL import Image
+
+from model_precision import match_model_dtype
+
+
+class _Pending:
+    __slots__ = ('image', 'future', 'enqueued_at')
+
+    def __init__(self, image: Image.Image):
+        self.image = image
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class BlipBatcher:
+    """Background scheduler in front of blip_model.generate"""
+
+    def __init__(self, processor, model, max_batch_size: int = 8, max_wait_ms: float = 10.0,
+                 max_length: int = 50, caption_fn=None):
+        self.processor = processor
+        self.model = model
+        # Optional alternative backend: caption_fn(images, max_length) -> captions
+        self.caption_fn = caption_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_length = max_length
+        self._queue = queue.Queue()
+        self._thread = None
+        self._running = False
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._batch_size_counts = {}
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="blip-batcher", daemon=True)
+        self._thread.start()
+
+    def restart(self):
+        """Start a fresh scheduler thread, e.g. in a forked worker where the parent's thread does not exist"""
+        self._queue = queue.Queue()
+        self._thread = None
+        self.start()
+
+    def stop(self):
+        self._running = False
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, image: Image.Image) -> Future:
+        """Queue an image; the Future resolves to its caption"""
+        pending = _Pending(image)
+        self._queue.put(pending)
+        return pending.future
+
+    def caption(self, image: Image.Image, timeout: float = None) -> str:
+        """Blocking convenience wrapper around submit()"""
+        return self.submit(image).result(timeout=timeout)
+
+    def _collect(self) -> List[_Pending]:
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._running = False
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._collect()
+            if not batch:
+                continue
+            started = time.perf_counter()
+            self._record(batch, started)
+            try:
+                captions = self._generate([pending.image for pending in batch])
+                for pending, caption in zip(batch, captions):
+                    pending.future.set_result(caption)
+            except Exception as e:
+                for pending in batch:
+                    pending.future.set_exception(e)
+
+    def _generate(self, images: List[Image.Image]) -> List[str]:
+        if self.caption_fn is not None:
+            return self.caption_fn(images, self.max_length)
+        inputs = self.processor(images=[image.convert('RGB') for image in images],
+                                return_tensors="pt", padding=True)
+        inputs = match_model_dtype(inputs, self.model)
+        with torch.no_grad():
+            out = self.model.generate(**inputs, max_length=self.max_length)
+        return self.processor.batch_decode(out, skip_special_tokens=True)
+
+    def _record(self, batch: List[_Pending], started: float):
+        waits = [started - pending.enqueued_at for pending in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._batch_size_counts[len(batch)] = self._batch_size_counts.get(len(batch), 0) + 1
+            self._queue_wait_total += sum(waits)
+            self._queue_wait_max = max(self._queue_wait_max, max(waits))
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch size distribution and queue wait times"""
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "pending": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+                "batch_size_counts": dict(sorted(self._batch_size_counts.items())),
+                "avg_queue_wait_ms": 1000.0 * self._queue_wait_total / self._items if self._items else 0.0,
+                "max_queue_wait_ms": 1000.0 * self._queue_wait_max
+            }
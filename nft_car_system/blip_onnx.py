@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+ONNX Runtime Backend for BLIP Captioning
+Exports the BLIP vision encoder and text decoder to ONNX and reimplements
+greedy decoding over the exported decoder, reusing its self-attention KV cache
+"""
+
+import os
+from typing import List
+
+import numpy as np
+import torch
+from PIL import Image
+
+DEFAULT_ONNX_DIR = 'blip_onnx'
+VISION_FILE = 'blip_vision_encoder.onnx'
+DECODER_FILE = 'blip_text_decoder.onnx'
+DECODER_WITH_PAST_FILE = 'blip_text_decoder_with_past.onnx'
+BLIP_MODEL_NAME = "Salesforce/blip-image-captioning-base"
+
+
+class _VisionEncoder(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.vision_model = model.vision_model
+
+    def forward(self, pixel_values):
+        return self.vision_model(pixel_values=pixel_values, return_dict=True).last_hidden_state
+
+
+def _kv_names(prefix: str, num_layers: int) -> List[str]:
+    return [f"{prefix}.{layer}.{kind}" for layer in range(num_layers) for kind in ('key', 'value')]
+
+
+class _TextDecoder(torch.nn.Module):
+    """Logits plus the flattened self-attention cache; past tensors are optional trailing inputs"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.text_decoder = model.text_decoder
+
+    def forward(self, input_ids, attention_mask, encoder_hidden_states, *past):
+        outputs = self.text_decoder(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            encoder_hidden_states=encoder_hidden_states,
+            past_key_values=tuple(zip(past[0::2], past[1::2])) if past else None,
+            use_cache=True,
+            return_dict=True
+        )
+        present = outputs.past_key_values
+        if hasattr(present, 'to_legacy_cache'):
+            present = present.to_legacy_cache()
+        return (outputs.logits,) + tuple(tensor for layer in present for tensor in layer[:2])
+
+
+def export_blip_onnx(output_dir: str = DEFAULT_ONNX_DIR, model=None, processor=None, opset: int = 17):
+    """Export the vision encoder and text decoder of BLIP to ONNX"""
+    if model is None or processor is None:
+        from transformers import BlipProcessor, BlipForConditionalGeneration
+        processor = BlipProcessor.from_pretrained(BLIP_MODEL_NAME)
+        model = BlipForConditionalGeneration.from_pretrained(BLIP_MODEL_NAME)
+    model.eval()
+    os.makedirs(output_dir, exist_ok=True)
+
+    pixel_values = processor(images=Image.new('RGB', (384, 384)), return_tensors="pt")['pixel_values']
+    with torch.no_grad():
+        image_embeds = _VisionEncoder(model)(pixel_values)
+
+    torch.onnx.export(
+        _VisionEncoder(model), (pixel_values,), os.path.join(output_dir, VISION_FILE),
+        input_names=['pixel_values'], output_names=['image_embeds'],
+        dynamic_axes={'pixel_values': {0: 'batch'}, 'image_embeds': {0: 'batch'}},
+        opset_version=opset
+    )
+
+    # The first step encodes the prompt and returns the cache; later steps feed one token plus the cache
+    num_layers = model.config.text_config.num_hidden_layers
+    past_names, present_names = _kv_names('past_key_values', num_layers), _kv_names('present', num_layers)
+    decoder = _TextDecoder(model)
+    input_ids = torch.full((1, 2), model.config.text_config.bos_token_id, dtype=torch.long)
+    attention_mask = torch.ones_like(input_ids)
+    torch.onnx.export(
+        decoder, (input_ids, attention_mask, image_embeds), os.path.join(output_dir, DECODER_FILE),
+        input_names=['input_ids', 'attention_mask', 'encoder_hidden_states'],
+        output_names=['logits'] + present_names,
+        dynamic_axes={
+            'input_ids': {0: 'batch', 1: 'sequence'},
+            'attention_mask': {0: 'batch', 1: 'sequence'},
+            'encoder_hidden_states': {0: 'batch'},
+            'logits': {0: 'batch', 1: 'sequence'},
+            **{name: {0: 'batch', 2: 'sequence'} for name in present_names}
+        },
+        opset_version=opset
+    )
+
+    with torch.no_grad():
+        past = decoder(input_ids, attention_mask, image_embeds)[1:]
+    next_ids = input_ids[:, -1:]
+    torch.onnx.export(
+        decoder, (next_ids, torch.ones(1, input_ids.shape[1] + 1, dtype=torch.long), image_embeds, *past),
+        os.path.join(output_dir, DECODER_WITH_PAST_FILE),
+        input_names=['input_ids', 'attention_mask', 'encoder_hidden_states'] + past_names,
+        output_names=['logits'] + present_names,
+        dynamic_axes={
+            'input_ids': {0: 'batch', 1: 'sequence'},
+            'attention_mask': {0: 'batch', 1: 'total_sequence'},
+            'encoder_hidden_states': {0: 'batch'},
+            'logits': {0: 'batch', 1: 'sequence'},
+            **{name: {0: 'batch', 2: 'past_sequence'} for name in past_names},
+            **{name: {0: 'batch', 2: 'total_sequence'} for name in present_names}
+        },
+        opset_version=opset
+    )
+    print(f"✅ Exported BLIP to ONNX in {output_dir}")
+
+
+class OnnxBlipCaptioner:
+    """Greedy BLIP captioning over ONNX Runtime sessions"""
+
+    def __init__(self, processor, text_config, onnx_dir: str = DEFAULT_ONNX_DIR, num_threads: int = 0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        providers = ['CPUExecutionProvider']
+        self.vision = ort.InferenceSession(os.path.join(onnx_dir, VISION_FILE), options, providers=providers)
+        self.decoder = ort.InferenceSession(os.path.join(onnx_dir, DECODER_FILE), options, providers=providers)
+        # Exports from before the KV cache have no with-past decoder; they recompute every step
+        with_past_path = os.path.join(onnx_dir, DECODER_WITH_PAST_FILE)
+        self.decoder_with_past = None
+        if os.path.exists(with_past_path) and len(self.decoder.get_outputs()) > 1:
+            self.decoder_with_past = ort.InferenceSession(with_past_path, options, providers=providers)
+            self.past_names = [inp.name for inp in self.decoder_with_past.get_inputs()[3:]]
+        self.processor = processor
+        # Mirrors BlipForConditionalGeneration.generate: start from BOS, stop at SEP
+        self.bos_token_id = text_config.bos_token_id
+        self.eos_token_id = text_config.sep_token_id
+        self.pad_token_id = text_config.pad_token_id
+
+    def caption(self, images: List[Image.Image], max_length: int = 50, use_cache: bool = True) -> List[str]:
+        """Caption a batch of images with greedy decoding"""
+        pixel_values = self.processor(
+            images=[image.convert('RGB') for image in images], return_tensors="np"
+        )['pixel_values'].astype(np.float32)
+        image_embeds = self.vision.run(['image_embeds'], {'pixel_values': pixel_values})[0]
+
+        batch = pixel_values.shape[0]
+        input_ids = np.full((batch, 1), self.bos_token_id, dtype=np.int64)
+        finished = np.zeros(batch, dtype=bool)
+        use_cache = use_cache and self.decoder_with_past is not None
+        present = None
+        while input_ids.shape[1] < max_length and not finished.all():
+            feed = {'attention_mask': np.ones_like(input_ids), 'encoder_hidden_states': image_embeds}
+            if present is None:
+                # First step (or no cache): run the whole sequence
+                outputs = self.decoder.run(None, {'input_ids': input_ids, **feed})
+            else:
+                outputs = self.decoder_with_past.run(
+                    None, {'input_ids': input_ids[:, -1:], **feed, **dict(zip(self.past_names, present))}
+                )
+            logits = outputs[0]
+            if use_cache:
+                present = outputs[1:]
+            next_tokens = logits[:, -1, :].argmax(axis=-1)
+            next_tokens = np.where(finished, self.pad_token_id, next_tokens)
+            input_ids = np.concatenate([input_ids, next_tokens[:, None]], axis=1)
+            finished |= next_tokens == self.eos_token_id
+        return self.processor.batch_decode(input_ids, skip_special_tokens=True)
+
+
+def main():
+    """Export BLIP to ONNX"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export BLIP captioning to ONNX")
+    parser.add_argument('--output', default=os.getenv('BLIP_ONNX_DIR', DEFAULT_ONNX_DIR))
+    parser.add_argument('--opset', type=int, default=17)
+    args = parser.parse_args()
+
+    print("🚗 Exporting BLIP to ONNX...")
+    export_blip_onnx(args.output, opset=args.opset)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+In-Memory Car Catalog
+Parses car_database_export.csv once into compact records with hash indexes
+on uuid, filename and manufacturer, and supports atomic hot reloads
+"""
+
+import csv
+import os
+import threading
+from typing import List, Dict, Any, Optional
+
+DEFAULT_CSV_PATH = 'car_database_export.csv'
+
+
+class CarRecord:
+    """One catalog row"""
+
+    __slots__ = (
+        'id', 'filename', 'uuid', 'manufacturer', 'model', 'vehicle_type',
+        'color', 'year_manufactured', 'batch_date', 'caption', 'image_path'
+    )
+
+    def __init__(self, row: Dict[str, str]):
+        for field in self.__slots__:
+            setattr(self, field, (row.get(field) or '').strip())
+
+    def to_info(self) -> Dict[str, Any]:
+        """Map the record onto the car_info response shape"""
+        return {
+            "make": self.manufacturer or 'Unknown',
+            "model": self.model or 'Unknown',
+            "year": self.year_manufactured or 'Unknown',
+            "type": self.vehicle_type or 'Unknown',
+            "color": self.color or 'Unknown',
+            "description": self.caption or 'No description available',
+            "uuid": self.uuid or 'Unknown',
+            "filename": self.filename or 'Unknown'
+        }
+
+
+class _CatalogSnapshot:
+    """Immutable records plus indexes; swapped as a whole on reload"""
+
+    __slots__ = ('records', 'by_uuid', 'by_filename', 'by_manufacturer', 'source')
+
+    def __init__(self, records: List[CarRecord], source: str):
+        self.records = tuple(records)
+        self.by_uuid = {}
+        self.by_filename = {}
+        self.by_manufacturer = {}
+        self.source = source
+        for record in self.records:
+            if record.uuid:
+                self.by_uuid[record.uuid.upper()] = record
+            if record.filename:
+                self.by_filename[record.filename.lower()] = record
+            if record.manufacturer:
+                self.by_manufacturer.setdefault(record.manufacturer.lower(), []).append(record)
+
+
+class CarCatalog:
+    """Thread-safe read view over the car catalog"""
+
+    def __init__(self, csv_path: str = DEFAULT_CSV_PATH):
+        self.csv_path = csv_path
+        self._snapshot = _CatalogSnapshot([], csv_path)
+        self._reload_lock = threading.Lock()
+        self._signature = None
+
+    def __len__(self) -> int:
+        return len(self._snapshot.records)
+
+    @staticmethod
+    def _file_signature(csv_path: str):
+        try:
+            stat = os.stat(csv_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _parse(csv_path: str) -> List[CarRecord]:
+        with open(csv_path, newline='') as f:
+            return [CarRecord(row) for row in csv.DictReader(f)]
+
+    def load(self, csv_path: Optional[str] = None) -> int:
+        """Parse a CSV and atomically swap it in; readers never see a partial catalog"""
+        with self._reload_lock:
+            path = csv_path or self.csv_path
+            # Taken before parsing, so a write racing the parse is picked up by the next check
+            signature = self._file_signature(path)
+            snapshot = _CatalogSnapshot(self._parse(path), path)
+            self._snapshot = snapshot
+            self._signature = signature
+            self.csv_path = path
+            return len(snapshot.records)
+
+    def reload(self, csv_path: Optional[str] = None) -> int:
+        """Swap in a new batch without restarting the service"""
+        return self.load(csv_path)
+
+    def reload_if_changed(self) -> Optional[int]:
+        """Reload when the CSV's mtime or size differs from the last load; None if unchanged.
+        Each server process calls this periodically, so a new batch reaches every worker."""
+        signature = self._file_signature(self.csv_path)
+        if signature is None or signature == self._signature:
+            return None
+        return self.load()
+
+    def get_by_uuid(self, uuid: str) -> Optional[CarRecord]:
+        return self._snapshot.by_uuid.get((uuid or '').upper())
+
+    def get_by_filename(self, filename: str) -> Optional[CarRecord]:
+        return self._snapshot.by_filename.get((filename or '').lower())
+
+    def get_by_manufacturer(self, manufacturer: str) -> List[CarRecord]:
+        return list(self._snapshot.by_manufacturer.get((manufacturer or '').lower(), ()))
+
+    def records(self) -> List[CarRecord]:
+        return list(self._snapshot.records)
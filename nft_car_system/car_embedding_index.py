@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Car Image Embedding Index
+Offline-built NumPy matrix of BLIP vision embeddings for every catalog row,
+searched with a single matrix multiply at request time
+"""
+
+import csv
+import os
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+import torch
+from PIL import Image
+
+from image_preprocess import prepare_image
+from model_precision import match_model_dtype
+
+DEFAULT_INDEX_PATH = 'car_embedding_index.npz'
+DEFAULT_CSV_PATH = 'car_database_export.csv'
+DEFAULT_IMAGE_ROOT = './data'
+BLIP_MODEL_NAME = "Salesforce/blip-image-captioning-base"
+
+
+def embed_images(images: List[Image.Image], processor, model) -> np.ndarray:
+    """Embed images with the BLIP vision encoder, returning L2-normalised rows"""
+    inputs = processor(images=[image.convert('RGB') for image in images], return_tensors="pt")
+    inputs = match_model_dtype(inputs, model)
+    with torch.no_grad():
+        vision_out = model.vision_model(pixel_values=inputs['pixel_values'])
+    vectors = vision_out.pooler_output.float().cpu().numpy()
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+def embed_image(image: Image.Image, processor, model) -> np.ndarray:
+    """Embed a single image, returning a 1-D L2-normalised vector"""
+    return embed_images([image], processor, model)[0]
+
+
+class CarEmbeddingIndex:
+    """Row-aligned embedding matrix over car_database_export.csv"""
+
+    def __init__(self, embeddings: np.ndarray, uuids: List[str], filenames: List[str]):
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.uuids = list(uuids)
+        self.filenames = list(filenames)
+
+    def __len__(self) -> int:
+        return self.embeddings.shape[0]
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_INDEX_PATH) -> 'CarEmbeddingIndex':
+        """Load an index written by save()"""
+        data = np.load(path, allow_pickle=False)
+        return cls(data['embeddings'], data['uuids'].tolist(), data['filenames'].tolist())
+
+    def save(self, path: str = DEFAULT_INDEX_PATH):
+        """Persist the index as a compressed .npz file"""
+        np.savez_compressed(
+            path,
+            embeddings=self.embeddings,
+            uuids=np.array(self.uuids),
+            filenames=np.array(self.filenames)
+        )
+
+    def search(self, query: np.ndarray, top_k: int = 5) -> List[Tuple[int, float]]:
+        """Return (row, cosine similarity) pairs for the top_k closest catalog images"""
+        if len(self) == 0:
+            return []
+        scores = self.embeddings @ query.astype(np.float32)
+        top_k = min(top_k, len(scores))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [(int(row), float(scores[row])) for row in ranked]
+
+
+def resolve_image_path(row: Dict[str, str], image_root: str) -> Optional[str]:
+    """Find the image for a catalog row under image_root, tolerating .tif/.TIF drift"""
+    filename = row.get('filename') or ''
+    candidates = [
+        os.path.join(image_root, row.get('image_path') or ''),
+        os.path.join(image_root, 'images', row.get('batch_date') or '', filename),
+        os.path.join(image_root, 'images', filename),
+    ]
+    for candidate in candidates:
+        stem, ext = os.path.splitext(candidate)
+        for path in (candidate, stem + ext.lower(), stem + ext.upper()):
+            if os.path.isfile(path):
+                return path
+    return None
+
+
+def build_index(csv_path: str = DEFAULT_CSV_PATH, image_root: str = DEFAULT_IMAGE_ROOT,
+                processor=None, model=None, batch_size: int = 16) -> CarEmbeddingIndex:
+    """Embed every catalog image that can be found on disk"""
+    if processor is None or model is None:
+        from transformers import BlipProcessor, BlipForConditionalGeneration
+        processor = BlipProcessor.from_pretrained(BLIP_MODEL_NAME)
+        model = BlipForConditionalGeneration.from_pretrained(BLIP_MODEL_NAME)
+    model.eval()
+
+    with open(csv_path, newline='') as f:
+        rows = list(csv.DictReader(f))
+
+    uuids, filenames, vectors = [], [], []
+    pending = []
+
+    def flush():
+        images = [prepare_image(Image.open(path), max_pixels=0) for _, path in pending]
+        vectors.append(embed_images(images, processor, model))
+        for row, _ in pending:
+            uuids.append(row['uuid'])
+            filenames.append(row['filename'])
+        pending.clear()
+
+    for row in rows:
+        path = resolve_image_path(row, image_root)
+        if path is None:
+            print(f"⚠️ Image not found for {row.get('filename')}, skipping")
+            continue
+        pending.append((row, path))
+        if len(pending) >= batch_size:
+            flush()
+            print(f"🔄 Embedded {len(uuids)}/{len(rows)} images")
+    if pending:
+        flush()
+
+    dim = vectors[0].shape[1] if vectors else 0
+    embeddings = np.vstack(vectors) if vectors else np.zeros((0, dim), dtype=np.float32)
+    print(f"✅ Built embedding index with {len(uuids)} of {len(rows)} catalog rows")
+    return CarEmbeddingIndex(embeddings, uuids, filenames)
+
+
+def main():
+    """Build the embedding index offline"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the car image embedding index")
+    parser.add_argument('--csv', default=DEFAULT_CSV_PATH)
+    parser.add_argument('--image-root', default=os.getenv('CAR_IMAGE_ROOT', DEFAULT_IMAGE_ROOT))
+    parser.add_argument('--output', default=os.getenv('CAR_INDEX_PATH', DEFAULT_INDEX_PATH))
+    parser.add_argument('--batch-size', type=int, default=16)
+    args = parser.parse_args()
+
+    print("🚗 Building car embedding index...")
+    index = build_index(args.csv, args.image_root, batch_size=args.batch_size)
+    index.save(args.output)
+    print(f"💾 Saved index to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
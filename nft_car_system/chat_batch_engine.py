@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Continuous Batching for Car Chat Generation
+One scheduler thread owns the chat model and decodes every active sequence
+together, one token per step. New requests are prefilled and join the batch
+at the next token boundary; finished sequences leave it immediately, so short
+answers never wait for long ones. Each sequence's KV cache is a row of the
+shared left-padded batch cache, added on join and sliced out on leave.
+Admission is bounded like the inference executor: at most max_batch_size
+decoding plus max_queue waiting, beyond which submit() raises ExecutorSaturated.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+from transformers import LogitsProcessorList, TemperatureLogitsWarper, TopKLogitsWarper, TopPLogitsWarper
+
+from inference_executor import ExecutorSaturated
+
+
+def _cache_length(past_key_values) -> int:
+    if past_key_values is None:
+        return 0
+    if hasattr(past_key_values, 'get_seq_length'):
+        return past_key_values.get_seq_length()
+    return past_key_values[0][0].shape[-2]
+
+
+def _to_layers(past_key_values) -> List[tuple]:
+    """[(key, value), ...] per layer, each [batch, heads, length, head_dim]"""
+    if hasattr(past_key_values, 'to_legacy_cache'):
+        past_key_values = past_key_values.to_legacy_cache()
+    return [(key, value) for key, value in past_key_values]
+
+
+def _left_pad(tensor: torch.Tensor, width: int) -> torch.Tensor:
+    """Left-pad the sequence dimension (-2) of a KV tensor with zeros"""
+    if width == 0:
+        return tensor
+    return torch.nn.functional.pad(tensor, (0, 0, width, 0))
+
+
+def sampling_warpers(model, temperature: float) -> LogitsProcessorList:
+    """Temperature, top-k and top-p warpers as generate(do_sample=True, temperature=...) sets them up"""
+    config = model.generation_config
+    warpers = LogitsProcessorList()
+    if temperature != 1.0:
+        warpers.append(TemperatureLogitsWarper(temperature))
+    if config.top_k:
+        warpers.append(TopKLogitsWarper(config.top_k))
+    if config.top_p is not None and config.top_p < 1.0:
+        warpers.append(TopPLogitsWarper(config.top_p))
+    return warpers
+
+
+class _Sequence:
+    __slots__ = ('input_ids', 'past_key_values', 'max_new_tokens', 'deadline', 'cancel_event',
+                 'stop_fn', 'streamer', 'future', 'enqueued_at', 'new_ids', 'done', 'interrupt_reason')
+
+    def __init__(self, input_ids, past_key_values, max_new_tokens, deadline, cancel_event, stop_fn, streamer):
+        self.input_ids = input_ids
+        self.past_key_values = past_key_values
+        self.max_new_tokens = max(1, max_new_tokens)
+        self.deadline = deadline
+        self.cancel_event = cancel_event
+        self.stop_fn = stop_fn
+        self.streamer = streamer
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.new_ids = []
+        self.done = False
+        self.interrupt_reason = None
+
+
+class ContinuousBatchEngine:
+    """Iteration-level scheduler in front of a causal LM"""
+
+    def __init__(self, model, tokenizer, max_batch_size: int = 8, temperature: float = 0.7, do_sample: bool = True,
+                 max_queue: int = 16):
+        self.model = model
+        self.eos_token_id = tokenizer.eos_token_id
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_queue = max(0, max_queue)
+        # One slot per submitted sequence, released when its future resolves
+        self._slots = threading.BoundedSemaphore(self.max_batch_size + self.max_queue)
+        # Greedy decoding (do_sample=False) matches generate(do_sample=False) token for token
+        self.do_sample = do_sample
+        self.warpers = sampling_warpers(model, temperature)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._running = False
+        # Batch state, one row per active sequence
+        self._active = []
+        self._layers = None
+        self._mask = None
+        self._last_tokens = None
+        self._cache_type = None
+        self._stats_lock = threading.Lock()
+        self._steps = 0
+        self._step_rows = 0
+        self._sequences = 0
+        self._tokens = 0
+        self._batch_size_counts = {}
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+        self._rejected = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="chat-batcher", daemon=True)
+        self._thread.start()
+
+    def restart(self):
+        """Start a fresh scheduler thread, e.g. in a forked worker where the parent's thread does not exist"""
+        self._queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(self.max_batch_size + self.max_queue)
+        self._active, self._layers, self._mask, self._last_tokens = [], None, None, None
+        self._thread = None
+        self.start()
+
+    def stop(self):
+        """Stop the scheduler thread; sequences still queued or decoding fail with ExecutorSaturated"""
+        self._running = False
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        stopped = ExecutorSaturated("chat batch engine stopped")
+        for sequence in self._active:
+            sequence.future.set_exception(stopped)
+        self._active, self._layers, self._mask, self._last_tokens = [], None, None, None
+        while True:
+            try:
+                sequence = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if sequence is not None and sequence.future.set_running_or_notify_cancel():
+                sequence.future.set_exception(stopped)
+
+    def submit(self, input_ids: torch.Tensor, max_new_tokens: int, past_key_values=None,
+               deadline: Optional[float] = None, cancel_event: Optional[threading.Event] = None,
+               stop_fn: Optional[Callable[[List[int]], bool]] = None, streamer=None, wait: bool = False) -> Future:
+        """Queue a [1, T] prompt (optionally with a KV cache for its first tokens).
+        The Future resolves to (new_ids, interrupt_reason) like generate() would produce.
+        Raises ExecutorSaturated when the batch and queue are full, unless wait is set."""
+        slots = self._slots
+        if not slots.acquire(blocking=wait):
+            with self._stats_lock:
+                self._rejected += 1
+            raise ExecutorSaturated(
+                f"chat batch full ({self.max_batch_size} decoding, {self.max_queue} queued)"
+            )
+        sequence = _Sequence(input_ids, past_key_values, max_new_tokens, deadline, cancel_event, stop_fn, streamer)
+        sequence.future.add_done_callback(lambda _: slots.release())
+        self._queue.put(sequence)
+        return sequence.future
+
+    def generate(self, *args, **kwargs):
+        """Blocking convenience wrapper around submit()"""
+        return self.submit(*args, **kwargs).result()
+
+    def _run(self):
+        while self._running:
+            self._admit()
+            if not self._active:
+                continue
+            try:
+                self._step()
+            except Exception as e:
+                for sequence in self._active:
+                    sequence.future.set_exception(e)
+                self._active, self._layers, self._mask, self._last_tokens = [], None, None, None
+                continue
+            self._retire()
+
+    def _admit(self):
+        """Prefill queued sequences into free batch rows; block only when idle"""
+        while len(self._active) < self.max_batch_size:
+            try:
+                sequence = self._queue.get(block=not self._active)
+            except queue.Empty:
+                break
+            if sequence is None:
+                self._running = False
+                break
+            if not sequence.future.set_running_or_notify_cancel():
+                continue
+            self._record_wait(time.perf_counter() - sequence.enqueued_at)
+            try:
+                layers, token = self._prefill(sequence)
+            except Exception as e:
+                sequence.future.set_exception(e)
+                continue
+            self._join(sequence, layers, token)
+            self._accept(sequence, int(token))
+        self._retire()
+
+    def _prefill(self, sequence: _Sequence):
+        """Encode the prompt (after any cached prefix) and sample its first token"""
+        input_ids, past_key_values = sequence.input_ids, sequence.past_key_values
+        past_length = _cache_length(past_key_values)
+        if past_length >= input_ids.shape[1]:
+            past_key_values, past_length = None, 0
+        with torch.no_grad():
+            outputs = self.model(
+                input_ids[:, past_length:],
+                past_key_values=past_key_values,
+                attention_mask=torch.ones_like(input_ids),
+                position_ids=torch.arange(past_length, input_ids.shape[1]).unsqueeze(0),
+                use_cache=True
+            )
+        self._cache_type = type(outputs.past_key_values)
+        sequence.past_key_values = None
+        if sequence.streamer is not None:
+            sequence.streamer.put(input_ids)
+        return _to_layers(outputs.past_key_values), self._sample(outputs.logits[:, -1, :])[0]
+
+    def _join(self, sequence: _Sequence, layers: List[tuple], token: torch.Tensor):
+        """Add a prefilled sequence as a new batch row, left-padding to a common length"""
+        length = layers[0][0].shape[-2]
+        mask = torch.ones(1, length, dtype=torch.long)
+        if not self._active:
+            self._layers, self._mask = layers, mask
+            self._last_tokens = token.view(1, 1)
+        else:
+            width = max(self._mask.shape[1], length)
+            batch_pad, row_pad = width - self._mask.shape[1], width - length
+            self._layers = [
+                (torch.cat([_left_pad(batch_key, batch_pad), _left_pad(key, row_pad)]),
+                 torch.cat([_left_pad(batch_value, batch_pad), _left_pad(value, row_pad)]))
+                for (batch_key, batch_value), (key, value) in zip(self._layers, layers)
+            ]
+            self._mask = torch.cat([
+                torch.nn.functional.pad(self._mask, (batch_pad, 0)),
+                torch.nn.functional.pad(mask, (row_pad, 0))
+            ])
+            self._last_tokens = torch.cat([self._last_tokens, token.view(1, 1)])
+        self._active.append(sequence)
+        with self._stats_lock:
+            self._sequences += 1
+
+    def _model_cache(self):
+        if hasattr(self._cache_type, 'from_legacy_cache'):
+            return self._cache_type.from_legacy_cache(tuple(self._layers))
+        return tuple(self._layers)
+
+    def _step(self):
+        """Decode one token for every active sequence"""
+        mask = torch.cat([self._mask, torch.ones(len(self._active), 1, dtype=torch.long)], dim=1)
+        with torch.no_grad():
+            outputs = self.model(
+                self._last_tokens,
+                past_key_values=self._model_cache(),
+                attention_mask=mask,
+                position_ids=mask.sum(dim=1, keepdim=True) - 1,
+                use_cache=True
+            )
+        self._layers = _to_layers(outputs.past_key_values)
+        self._mask = mask
+        tokens = self._sample(outputs.logits[:, -1, :])
+        self._last_tokens = tokens.view(-1, 1)
+        for sequence, token in zip(self._active, tokens.tolist()):
+            self._accept(sequence, token)
+        with self._stats_lock:
+            self._steps += 1
+            self._step_rows += len(self._active)
+            self._batch_size_counts[len(self._active)] = self._batch_size_counts.get(len(self._active), 0) + 1
+
+    def _sample(self, logits: torch.Tensor) -> torch.Tensor:
+        if not self.do_sample:
+            return logits.argmax(dim=-1)
+        scores = self.warpers(None, logits.float())
+        return torch.multinomial(torch.softmax(scores, dim=-1), num_samples=1).squeeze(1)
+
+    def _accept(self, sequence: _Sequence, token: int):
+        """Append a token and apply the same stopping rules generate() would"""
+        sequence.new_ids.append(token)
+        if sequence.streamer is not None:
+            sequence.streamer.put(torch.tensor([token]))
+        if token == self.eos_token_id or len(sequence.new_ids) >= sequence.max_new_tokens:
+            sequence.done = True
+        elif sequence.stop_fn is not None and sequence.stop_fn(sequence.new_ids):
+            sequence.done = True
+        elif sequence.cancel_event is not None and sequence.cancel_event.is_set():
+            sequence.done, sequence.interrupt_reason = True, "cancelled"
+        elif sequence.deadline is not None and time.perf_counter() >= sequence.deadline:
+            sequence.done, sequence.interrupt_reason = True, "deadline"
+
+    def _retire(self):
+        """Resolve finished sequences and drop their rows (and all-padding columns) from the batch"""
+        if not any(sequence.done for sequence in self._active):
+            return
+        keep = [row for row, sequence in enumerate(self._active) if not sequence.done]
+        for sequence in self._active:
+            if sequence.done:
+                if sequence.streamer is not None:
+                    sequence.streamer.end()
+                with self._stats_lock:
+                    self._tokens += len(sequence.new_ids)
+                sequence.future.set_result((torch.tensor(sequence.new_ids, dtype=torch.long),
+                                            sequence.interrupt_reason))
+        self._active = [self._active[row] for row in keep]
+        if not self._active:
+            self._layers, self._mask, self._last_tokens = None, None, None
+            return
+        rows = torch.tensor(keep)
+        mask = self._mask.index_select(0, rows)
+        start = int(mask.any(dim=0).long().argmax())
+        self._mask = mask[:, start:]
+        self._layers = [(key.index_select(0, rows)[:, :, start:], value.index_select(0, rows)[:, :, start:])
+                        for key, value in self._layers]
+        self._last_tokens = self._last_tokens.index_select(0, rows)
+
+    def _record_wait(self, wait: float):
+        with self._stats_lock:
+            self._queue_wait_total += wait
+            self._queue_wait_max = max(self._queue_wait_max, wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch occupancy and queue wait times"""
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_queue": self.max_queue,
+                "pending": self._queue.qsize(),
+                "rejected": self._rejected,
+                "active": len(self._active),
+                "sequences": self._sequences,
+                "tokens": self._tokens,
+                "steps": self._steps,
+                "avg_batch_size": self._step_rows / self._steps if self._steps else 0.0,
+                "batch_size_counts": dict(sorted(self._batch_size_counts.items())),
+                "avg_queue_wait_ms": 1000.0 * self._queue_wait_total / self._sequences if self._sequences else 0.0,
+                "max_queue_wait_ms": 1000.0 * self._queue_wait_max
+            }
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Reduced-Resolution Image Decoding
+Decodes incoming NFT images at the size the models need: JPEG draft mode,
+the smallest adequate TIFF page, or early thumbnailing, behind a pixel guard
+"""
+
+from PIL import Image
+
+# BLIP resizes to 384x384, so the shorter side never needs to exceed this
+MODEL_INPUT_SIZE = 384
+DEFAULT_MAX_PIXELS = 150_000_000
+
+
+class ImageTooLarge(ValueError):
+    """Raised when an upload's header declares more pixels than allowed"""
+
+
+def _select_tiff_page(image: Image.Image, min_side: int):
+    """Seek to the smallest page of a multi-page/pyramidal TIFF that still covers min_side"""
+    n_frames = getattr(image, 'n_frames', 1)
+    if image.format != 'TIFF' or n_frames < 2:
+        return
+    best_frame, best_pixels = 0, image.size[0] * image.size[1]
+    for frame in range(1, n_frames):
+        image.seek(frame)
+        width, height = image.size
+        if min(width, height) >= min_side and width * height < best_pixels:
+            best_frame, best_pixels = frame, width * height
+    image.seek(best_frame)
+
+
+def prepare_image(image: Image.Image, target_size: int = MODEL_INPUT_SIZE,
+                  max_pixels: int = DEFAULT_MAX_PIXELS) -> Image.Image:
+    """
+    Decode a lazily-opened image at reduced resolution
+    The original size and format are kept in image.info / image.format
+    """
+    width, height = image.size
+    if max_pixels and width * height > max_pixels:
+        raise ImageTooLarge(f"Image is {width}x{height} ({width * height} pixels), limit is {max_pixels}")
+
+    original_format = image.format
+    original_size = image.size
+
+    if image.format == 'JPEG':
+        # DCT scaling: libjpeg decodes directly at 1/2, 1/4 or 1/8 size
+        image.draft('RGB', (target_size, target_size))
+    else:
+        _select_tiff_page(image, target_size)
+
+    # Shrink so the shorter side is target_size, keeping aspect ratio
+    width, height = image.size
+    scale = target_size / min(width, height)
+    if scale < 1:
+        image.thumbnail((max(1, round(width * scale)), max(1, round(height * scale))), Image.BICUBIC)
+    else:
+        image.load()
+
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.format = original_format
+    image.info['original_size'] = original_size
+    return image
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Bounded Inference Executor
+Runs blocking PIL/torch work on a fixed pool of worker threads with a bounded
+queue, so the asyncio event loop only does I/O and overload fails fast
+"""
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any
+
+
+class ExecutorSaturated(Exception):
+    """Raised when every worker is busy and the queue is full"""
+
+
+class InferenceExecutor:
+    """Thread pool with admission control"""
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 16):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        self._rejected = 0
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run fn(*args, **kwargs) on a worker; raise ExecutorSaturated instead of queueing unboundedly"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise ExecutorSaturated(
+                f"inference queue full ({self.max_workers} workers, {self.max_queue} queued)"
+            )
+        with self._lock:
+            self._admitted += 1
+
+        def call():
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        # Carry the caller's context (e.g. per-request timings) into the worker thread
+        context = contextvars.copy_context()
+        try:
+            future = self._pool.submit(context.run, call)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def _release(self):
+        with self._lock:
+            self._admitted -= 1
+        self._slots.release()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Worker occupancy and admission counters"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": max(0, self._admitted - self._running),
+                "rejected": self._rejected
+            }
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Load Test for the ML API
+Drives /analyze-nft with synthetic NFT traffic, either in-process through the
+ASGI app or against a running server, and writes latency percentiles,
+throughput and error rates as JSON so builds can be compared.
+
+Traffic mixes catalog images (recognised from the catalog) with novel
+generated images and varies the question. Closed loop: --concurrency clients
+send back to back. Open loop: requests arrive at --rate per second whatever
+the service does, which is what shows queueing and 503s under saturation.
+
+Usage:
+  python load_test.py --in-process --concurrency 4 --requests 100
+  python load_test.py --url http://127.0.0.1:8000 --rate 5 --duration 60
+"""
+
+import argparse
+import asyncio
+import base64
+import csv
+import io
+import json
+import os
+import random
+import subprocess
+import time
+from collections import Counter
+
+import httpx
+from PIL import Image, ImageDraw
+
+from car_catalog import CarCatalog, DEFAULT_CSV_PATH
+from car_embedding_index import resolve_image_path, DEFAULT_IMAGE_ROOT
+
+DATASET_PATH = 'car_chat_llm_dataset.csv'
+FALLBACK_QUESTIONS = ["Tell me about this car", "What year is this car from?", "Who manufactured this car?"]
+
+
+def load_questions(path: str = DATASET_PATH):
+    """Distinct user questions from the chat dataset"""
+    if not os.path.exists(path):
+        return list(FALLBACK_QUESTIONS)
+    questions = set()
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            first_line = row['text'].strip().split('\n', 1)[0]
+            if first_line.startswith('User:'):
+                questions.add(first_line[len('User:'):].strip())
+    return sorted(q for q in questions if q) or list(FALLBACK_QUESTIONS)
+
+
+def encode_image(path: str) -> str:
+    """Base64 JPEG of a catalog image, shrunk so payload size does not dominate"""
+    with Image.open(path) as image:
+        image = image.convert('RGB')
+        image.thumbnail((1024, 1024))
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=90)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def catalog_images(count: int, rng: random.Random, csv_path: str, image_root: str):
+    """Up to count (uuid, base64) pairs for catalog cars whose images are on disk"""
+    catalog = CarCatalog(csv_path)
+    catalog.load()
+    records = catalog.records()
+    rng.shuffle(records)
+    images = []
+    for record in records:
+        if len(images) >= count:
+            break
+        path = resolve_image_path({'filename': record.filename, 'image_path': record.image_path,
+                                   'batch_date': record.batch_date}, image_root)
+        if path is not None:
+            images.append((record.uuid, encode_image(path)))
+    return images
+
+
+def novel_image(rng: random.Random, size: int = 512) -> str:
+    """A random picture no catalog image will match"""
+    image = Image.new('RGB', (size, size), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x0, y0 = rng.randrange(size), rng.randrange(size)
+        x1, y1 = x0 + rng.randrange(16, size // 2), y0 + rng.randrange(16, size // 2)
+        shape = draw.ellipse if rng.random() < 0.5 else draw.rectangle
+        shape((x0, y0, x1, y1), fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+class TrafficMix:
+    """Draws /analyze-nft payloads from the configured image and question mix"""
+
+    def __init__(self, catalog, novel, questions, catalog_fraction: float, rng: random.Random,
+                 max_new_tokens: int = None, deadline_ms: float = None):
+        self.catalog = catalog
+        self.novel = novel
+        self.questions = questions
+        self.catalog_fraction = catalog_fraction if catalog else 0.0
+        self.rng = rng
+        self.max_new_tokens = max_new_tokens
+        self.deadline_ms = deadline_ms
+        self.sent = 0
+
+    def next(self):
+        """(kind, payload) for the next request"""
+        self.sent += 1
+        if self.rng.random() < self.catalog_fraction:
+            kind, (_, image_base64) = "catalog", self.rng.choice(self.catalog)
+        else:
+            kind, image_base64 = "novel", self.rng.choice(self.novel)
+        payload = {
+            "image_base64": image_base64,
+            "token_id": f"load-test-{self.sent}",
+            "collection_address": "0x0",
+            "user_message": self.rng.choice(self.questions)
+        }
+        if self.max_new_tokens:
+            payload["max_new_tokens"] = self.max_new_tokens
+        if self.deadline_ms:
+            payload["deadline_ms"] = self.deadline_ms
+        return kind, payload
+
+
+async def send(client: httpx.AsyncClient, kind: str, payload: dict, timeout: float) -> dict:
+    """One timed request; failures are recorded rather than raised"""
+    started = time.perf_counter()
+    result = {"kind": kind}
+    try:
+        response = await client.post("/analyze-nft", json=payload, timeout=timeout)
+        result["status"] = response.status_code
+        if response.status_code == 200:
+            body = response.json()
+            result["match_method"] = body.get("car_info", {}).get("match_method")
+            result["stop_reason"] = (body.get("ml_insights", {}).get("generation") or {}).get("stop_reason")
+            result["degraded"] = bool(body.get("ml_insights", {}).get("degraded"))
+    except httpx.TimeoutException:
+        result["status"] = "timeout"
+    except httpx.HTTPError as e:
+        result["status"] = type(e).__name__
+    result["latency_s"] = time.perf_counter() - started
+    return result
+
+
+async def closed_loop(client, mix: TrafficMix, total: int, concurrency: int, timeout: float):
+    """concurrency clients, each sending its next request as soon as the last returns"""
+    results = []
+    remaining = total
+
+    async def client_loop():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            results.append(await send(client, *mix.next(), timeout))
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return results
+
+
+async def open_loop(client, mix: TrafficMix, rate: float, duration: float, timeout: float,
+                    rng: random.Random, arrival: str = "poisson"):
+    """Start requests at the given arrival rate without waiting for earlier ones"""
+    tasks = []
+    started = time.perf_counter()
+    next_at = 0.0
+    while next_at < duration:
+        delay = started + next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(send(client, *mix.next(), timeout)))
+        next_at += rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+    return await asyncio.gather(*tasks)
+
+
+def percentile(ordered, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def summarize(results, elapsed: float) -> dict:
+    """Latency percentiles (successful requests), throughput and error rate"""
+    ok = sorted(r["latency_s"] for r in results if r["status"] == 200)
+    errors = sum(1 for r in results if r["status"] != 200)
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": errors,
+        "error_rate": errors / len(results) if results else 0.0,
+        "degraded_rate": sum(1 for r in results if r.get("degraded")) / len(ok) if ok else 0.0,
+        "throughput_rps": len(ok) / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "mean": 1000 * sum(ok) / len(ok) if ok else 0.0,
+            "p50": 1000 * percentile(ok, 0.50),
+            "p95": 1000 * percentile(ok, 0.95),
+            "p99": 1000 * percentile(ok, 0.99),
+            "max": 1000 * ok[-1] if ok else 0.0
+        },
+        "status_codes": dict(Counter(str(r["status"]) for r in results)),
+        "match_methods": dict(Counter(str(r.get("match_method")) for r in results if r["status"] == 200)),
+        "stop_reasons": dict(Counter(str(r.get("stop_reason")) for r in results if r["status"] == 200))
+    }
+
+
+def build_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def in_process_client() -> httpx.AsyncClient:
+    """Load the service in this process and call the ASGI app directly"""
+    import ml_api_service as service
+
+    count = service.car_catalog.load()
+    print(f"✅ Car catalog loaded ({count} cars)")
+    service.load_models()
+    service.models_ready.set()
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=service.app), base_url="http://load-test")
+
+
+async def run_load_test(args) -> dict:
+    rng = random.Random(args.seed)
+    questions = load_questions(args.dataset)
+    catalog = catalog_images(args.catalog_images, rng, args.csv, args.image_root) if args.catalog_fraction > 0 else []
+    if args.catalog_fraction > 0 and not catalog:
+        print("⚠️ No catalog images found on disk, sending novel images only")
+    novel = [novel_image(rng) for _ in range(args.novel_images)]
+    mix = TrafficMix(catalog, novel, questions, args.catalog_fraction, rng, args.max_new_tokens, args.deadline_ms)
+    print(f"📋 {len(catalog)} catalog images, {len(novel)} novel images, {len(questions)} questions")
+
+    if args.in_process:
+        client = in_process_client()
+    else:
+        limits = httpx.Limits(max_connections=None if args.rate else args.concurrency)
+        client = httpx.AsyncClient(base_url=args.url, limits=limits)
+
+    async with client:
+        for _ in range(args.warmup):
+            await send(client, *mix.next(), args.timeout)
+
+        started = time.perf_counter()
+        if args.rate:
+            print(f"🚀 Open loop: {args.rate}/s ({args.arrival}) for {args.duration:.0f}s")
+            results = await open_loop(client, mix, args.rate, args.duration, args.timeout, rng, args.arrival)
+        else:
+            print(f"🚀 Closed loop: {args.requests} requests from {args.concurrency} clients")
+            results = await closed_loop(client, mix, args.requests, args.concurrency, args.timeout)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "build": build_revision(),
+        "target": "in-process" if args.in_process else args.url,
+        "config": {
+            "mode": "open" if args.rate else "closed",
+            "rate": args.rate,
+            "arrival": args.arrival if args.rate else None,
+            "duration_s": args.duration if args.rate else None,
+            "concurrency": None if args.rate else args.concurrency,
+            "catalog_fraction": mix.catalog_fraction,
+            "max_new_tokens": args.max_new_tokens,
+            "deadline_ms": args.deadline_ms,
+            "seed": args.seed
+        },
+        "elapsed_s": elapsed,
+        "overall": summarize(results, elapsed),
+        "by_kind": {kind: summarize([r for r in results if r["kind"] == kind], elapsed)
+                    for kind in sorted({r["kind"] for r in results})}
+    }
+
+
+def print_summary(summary: dict):
+    latency = summary["latency_ms"]
+    print(f"   {summary['ok']}/{summary['requests']} ok, {summary['throughput_rps']:.2f} req/s, "
+          f"errors {summary['error_rate']:.1%}")
+    print(f"   p50 {latency['p50']:.0f}ms  p95 {latency['p95']:.0f}ms  p99 {latency['p99']:.0f}ms  "
+          f"max {latency['max']:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test /analyze-nft with synthetic NFT traffic")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', default='http://127.0.0.1:8000', help="Running service to test")
+    target.add_argument('--in-process', action='store_true', help="Load the service here and call the ASGI app")
+    parser.add_argument('--concurrency', type=int, default=4, help="Closed-loop clients")
+    parser.add_argument('--requests', type=int, default=100, help="Closed-loop request count")
+    parser.add_argument('--rate', type=float, help="Open-loop arrival rate (requests/s)")
+    parser.add_argument('--duration', type=float, default=60.0, help="Open-loop duration (s)")
+    parser.add_argument('--arrival', choices=('poisson', 'uniform'), default='poisson')
+    parser.add_argument('--catalog-fraction', type=float, default=0.5, help="Share of requests using catalog images")
+    parser.add_argument('--catalog-images', type=int, default=50)
+    parser.add_argument('--novel-images', type=int, default=20)
+    parser.add_argument('--max-new-tokens', type=int)
+    parser.add_argument('--deadline-ms', type=float)
+    parser.add_argument('--warmup', type=int, default=2, help="Unmeasured requests sent first")
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--csv', default=os.getenv('CAR_CATALOG_PATH', DEFAULT_CSV_PATH))
+    parser.add_argument('--image-root', default=os.getenv('CAR_IMAGE_ROOT', DEFAULT_IMAGE_ROOT))
+    parser.add_argument('--output', default='load_test_results.json')
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load_test(args))
+    print("\n📊 Overall")
+    print_summary(report["overall"])
+    for kind, summary in report["by_kind"].items():
+        print(f"📊 {kind}")
+        print_summary(summary)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,50 @@ ML API Service for NFT Car Analysis
 Bridge between your MiniApp and trained ML models
 """
 
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import torch
 from transformers import AutoTokenizer, AutoModelForCausalLM, BlipProcessor, BlipForConditionalGeneration
+from transformers import TextStreamer, StoppingCriteria, StoppingCriteriaList
 from PIL import Image
 import io
 import base64
 import json
 import os
-from typing import Optional, Dict, Any
+import hashlib
+import tempfile
+import asyncio
+import threading
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Callable
+from collections import namedtuple
+from contextlib import contextmanager
+
+from analysis_cache import AnalysisCache, content_fingerprint
+from blip_batcher import BlipBatcher
+from blip_onnx import OnnxBlipCaptioner
+from chat_batch_engine import ContinuousBatchEngine
+from car_catalog import CarCatalog
+from image_preprocess import prepare_image, ImageTooLarge, MODEL_INPUT_SIZE
+from model_registry import ChatModelRegistry, parse_model_paths
+from model_precision import apply_precision, match_model_dtype
+from inference_executor import InferenceExecutor, ExecutorSaturated
+from car_embedding_index import CarEmbeddingIndex, embed_image, embed_images
+from phash_index import PerceptualHashIndex
+from prefix_kv_cache import PrefixKVCache
+from precomputed_store import PrecomputedStore
+from request_coalescer import RequestCoalescer
+from tier_latency import TierLatency
+from token_index import TokenIndex
+from service_metrics import (
+    MetricsRegistry, Counter, Gauge, Histogram, stage_timer, request_timings, server_timing_header
+)
+
+PROCESS_STARTED = time.perf_counter()
 
 # Initialize FastAPI app
 app = FastAPI(title="NFT Car ML API", version="1.0.0")
@@ -30,15 +63,182 @@ app.add_middleware(
 
 # Global variables for models
 car_chat_model = None
+car_chat_draft_model = None
+car_chat_engine = None
 car_chat_tokenizer = None
 blip_processor = None
 blip_model = None
+car_index = None
+phash_index = None
+token_index = None
+blip_batcher = None
+blip_onnx_captioner = None
+analysis_cache = None
+precomputed_store = None
+models_version = None
+prefix_kv_cache = PrefixKVCache(int(float(os.getenv('PREFIX_KV_CACHE_MAX_MB', '256')) * 1024 * 1024))
+car_catalog = CarCatalog(os.getenv('CAR_CATALOG_PATH', 'car_database_export.csv'))
+catalog_watcher = None
+
+# Prometheus metrics (see /metrics)
+metrics = MetricsRegistry()
+STAGE_SECONDS = metrics.register(Histogram(
+    'nft_ml_stage_seconds', 'Time spent in each /analyze-nft pipeline stage', ['stage']
+))
+REQUEST_SECONDS = metrics.register(Histogram(
+    'nft_ml_request_seconds', 'End-to-end HTTP request latency', ['path', 'status']
+))
+CHAT_TOKENS = metrics.register(Counter(
+    'nft_ml_chat_tokens_total', 'Tokens generated by the car chat model', ['chat_model']
+))
+CHAT_STOP_REASONS = metrics.register(Counter(
+    'nft_ml_chat_stop_reasons_total', 'Why chat generation stopped (eos, turn_marker, max_new_tokens, deadline, ...)',
+    ['reason']
+))
+CHAT_TOKENS_PER_SECOND = metrics.register(Histogram(
+    'nft_ml_chat_tokens_per_second', 'Chat generation throughput per request', ['chat_model'],
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300)
+))
+TIER_OUTCOMES = metrics.register(Counter(
+    'nft_ml_tier_outcomes_total', 'Latency-budgeted /analyze-nft tiers by outcome (ran, cached, skipped, truncated, ...)',
+    ['tier', 'outcome']
+))
+COALESCED_REQUESTS = metrics.register(Counter(
+    'nft_ml_coalesced_requests_total', 'Requests answered by attaching to an identical in-flight analysis',
+    ['endpoint']
+))
+http_in_flight = 0
+http_in_flight_lock = threading.Lock()
+
+def stage(name: str):
+    """Time a pipeline stage for /metrics and the Server-Timing header"""
+    return stage_timer(STAGE_SECONDS, name)
+
+# Readiness: set once both models are loaded and warm
+models_ready = threading.Event()
+startup_error = None
+startup_timings = {}
+
+# Identical concurrent analyze requests share one inference
+request_coalescer = RequestCoalescer()
+
+# Observed tier durations decide what fits a request's latency budget
+tier_latency = TierLatency()
+
+# Blocking PIL/torch work runs here so the event loop only does I/O
+inference_executor = InferenceExecutor(
+    max_workers=int(os.getenv('INFERENCE_WORKERS', '2')),
+    max_queue=int(os.getenv('INFERENCE_MAX_QUEUE', '16'))
+)
+
+# Model identity
+BLIP_MODEL_NAME = "Salesforce/blip-image-captioning-base"
+CAR_CHAT_MODEL_PATH = './simple_car_chat_model'
+
+# Additional chat models served on demand (per collection, per language)
+DEFAULT_CHAT_MODEL = 'default'
+CHAT_MODELS = os.getenv('CHAT_MODELS', '')
+CHAT_MODELS_DIR = os.getenv('CHAT_MODELS_DIR', '')
+CHAT_MODEL_MEMORY_BUDGET_MB = float(os.getenv('CHAT_MODEL_MEMORY_BUDGET_MB', '4096'))
+
+# Assisted generation: a small draft model with the chat model's vocabulary proposes
+# tokens that the default chat model verifies in one forward pass (empty = off)
+CHAT_DRAFT_MODEL_PATH = os.getenv('CHAT_DRAFT_MODEL_PATH', '')
+CHAT_NUM_ASSISTANT_TOKENS = int(os.getenv('CHAT_NUM_ASSISTANT_TOKENS', '5'))
+
+# Continuous batching: concurrent default-model chats share one decode loop, up to
+# this many sequences (0 = one generate() per request; off when a draft model is set).
+# Workers only encode the prompt; the event loop awaits the decode, so no worker waits on it.
+# Chats beyond the batch plus CHAT_ENGINE_MAX_QUEUE waiting are rejected with a 503.
+CHAT_ENGINE_MAX_BATCH = int(os.getenv('CHAT_ENGINE_MAX_BATCH', '8'))
+CHAT_ENGINE_MAX_QUEUE = int(os.getenv('CHAT_ENGINE_MAX_QUEUE', '16'))
+
+# Inference precision: fp32, bf16 or int8 (dynamic quantization of Linear layers)
+INFERENCE_PRECISION = os.getenv('INFERENCE_PRECISION', 'fp32').lower()
+
+# Chat generation budgets (per request via max_new_tokens / deadline_ms)
+CHAT_MAX_NEW_TOKENS = int(os.getenv('CHAT_MAX_NEW_TOKENS', '100'))
+CHAT_MAX_NEW_TOKENS_LIMIT = int(os.getenv('CHAT_MAX_NEW_TOKENS_LIMIT', '256'))
+CHAT_TEMPERATURE = 0.7
+
+# Latency budget for /analyze-nft in ms (0 = none; a request's deadline_ms overrides it).
+# With a budget the catalog answer always comes back, the BLIP caption and the chat
+# answer are added only while they are expected to fit
+ANALYZE_LATENCY_BUDGET_MS = float(os.getenv('ANALYZE_LATENCY_BUDGET_MS', '0'))
+
+# Analysis cache configuration
+ANALYSIS_CACHE_PATH = os.getenv('ANALYSIS_CACHE_PATH', 'analysis_cache.sqlite3')
+ANALYSIS_CACHE_MAX_ITEMS = int(os.getenv('ANALYSIS_CACHE_MAX_ITEMS', '1024'))
+
+# Offline precomputed analyses (built by precompute_analyses.py)
+PRECOMPUTED_STORE_PATH = os.getenv('PRECOMPUTED_STORE_PATH', 'precomputed_analyses.sqlite3')
+
+# Multipart upload configuration
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', str(20 * 1024 * 1024)))
+# Allowance for multipart boundaries and the form fields next to the image
+MAX_UPLOAD_OVERHEAD_BYTES = 64 * 1024
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Uploads larger than this are spooled to disk, as Starlette does
+UPLOAD_SPOOL_BYTES = 1024 * 1024
+
+# Decode-at-model-size configuration
+IMAGE_TARGET_SIZE = int(os.getenv('IMAGE_TARGET_SIZE', str(MODEL_INPUT_SIZE)))
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', '150000000'))
+# Keep PIL's own decompression-bomb guard in step with ours (0 disables both)
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS or None
+
+# BLIP captioning backend: torch or onnx (export with blip_onnx.py)
+BLIP_BACKEND = os.getenv('BLIP_BACKEND', 'torch').lower()
+BLIP_ONNX_DIR = os.getenv('BLIP_ONNX_DIR', 'blip_onnx')
+
+# BLIP micro-batching configuration
+BLIP_MAX_BATCH_SIZE = int(os.getenv('BLIP_MAX_BATCH_SIZE', '8'))
+BLIP_MAX_WAIT_MS = float(os.getenv('BLIP_MAX_WAIT_MS', '10'))
+
+# Batch endpoint configuration
+MAX_BATCH_ITEMS = int(os.getenv('MAX_BATCH_ITEMS', '64'))
+BATCH_DECODE_WORKERS = int(os.getenv('BATCH_DECODE_WORKERS', '4'))
+CHAT_BATCH_SIZE = int(os.getenv('CHAT_BATCH_SIZE', '8'))
+
+# Embedding index configuration
+CAR_INDEX_PATH = os.getenv('CAR_INDEX_PATH', 'car_embedding_index.npz')
+CAR_MATCH_TOP_K = int(os.getenv('CAR_MATCH_TOP_K', '5'))
+CAR_MATCH_MIN_SCORE = float(os.getenv('CAR_MATCH_MIN_SCORE', '0.85'))
+
+# Every worker re-reads CAR_CATALOG_PATH when it changes on disk (0 disables the check)
+CATALOG_WATCH_INTERVAL_S = float(os.getenv('CATALOG_WATCH_INTERVAL_S', '5'))
+
+# Token-ID fast path: (collection_address, token_id) -> catalog UUID (build with token_index.py)
+TOKEN_INDEX_PATH = os.getenv('TOKEN_INDEX_PATH', 'token_index.json')
+
+# Perceptual hash fast path configuration
+CAR_PHASH_PATH = os.getenv('CAR_PHASH_PATH', 'car_phash_index.npz')
+CAR_PHASH_MAX_DISTANCE = int(os.getenv('CAR_PHASH_MAX_DISTANCE', '6'))
+
+# Non-default chat models, loaded on demand within a RAM budget
+chat_model_registry = ChatModelRegistry(
+    parse_model_paths(CHAT_MODELS, CHAT_MODELS_DIR),
+    int(CHAT_MODEL_MEMORY_BUDGET_MB * 1024 * 1024),
+    lambda path: load_chat_model_from_path(path)
+)
+
+# Fan-out pool for per-item work inside one /analyze-nft/batch job
+batch_pool = ThreadPoolExecutor(max_workers=BATCH_DECODE_WORKERS, thread_name_prefix="batch")
 
 class NFTRequest(BaseModel):
-    image_base64: str
+    # Optional for tokens in the token index, which are identified without the image
+    image_base64: Optional[str] = None
     token_id: str
     collection_address: str
     user_message: Optional[str] = "Tell me about this car"
+    chat_model: Optional[str] = None
+    # Chat generation budget: token cap and wall-clock deadline measured from arrival
+    max_new_tokens: Optional[int] = None
+    deadline_ms: Optional[float] = None
+
+class NFTBatchRequest(BaseModel):
+    requests: List[NFTRequest]
+    stream: Optional[bool] = False
 
 class MLResponse(BaseModel):
     success: bool
@@ -47,175 +247,1610 @@ class MLResponse(BaseModel):
     chat_response: str
     token_id: str
 
+def load_chat_model_from_path(model_path: str):
+    """Load a car chat model at the configured precision and warm it with a synthetic generation"""
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = apply_precision(AutoModelForCausalLM.from_pretrained(model_path), INFERENCE_PRECISION)
+    inputs = tokenizer.encode("User: What is this car?\nAssistant:", return_tensors="pt")
+    with torch.no_grad():
+        model.generate(
+            inputs,
+            attention_mask=torch.ones_like(inputs),
+            max_new_tokens=4,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id
+        )
+    return tokenizer, model
+
+def load_draft_model(draft_path: str, tokenizer, model):
+    """Load the assisted-generation draft model and warm it against the chat model"""
+    draft_tokenizer = AutoTokenizer.from_pretrained(draft_path)
+    if draft_tokenizer.get_vocab() != tokenizer.get_vocab():
+        print(f"⚠️ Draft model {draft_path} has a different vocabulary, assisted generation disabled")
+        return None
+    draft = apply_precision(AutoModelForCausalLM.from_pretrained(draft_path), INFERENCE_PRECISION)
+    draft.generation_config.num_assistant_tokens = CHAT_NUM_ASSISTANT_TOKENS
+    inputs = tokenizer.encode("User: What is this car?\nAssistant:", return_tensors="pt")
+    with torch.no_grad():
+        model.generate(
+            inputs,
+            attention_mask=torch.ones_like(inputs),
+            assistant_model=draft,
+            max_new_tokens=4,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id
+        )
+    return draft
+
+def load_chat_model():
+    """Load your trained car chat model (warm) as the default chat model"""
+    global car_chat_model, car_chat_tokenizer, car_chat_draft_model, car_chat_engine
+    
+    model_path = CAR_CHAT_MODEL_PATH
+    if not os.path.exists(model_path):
+        print("⚠️ Car chat model not found, using fallback")
+        return
+    
+    started = time.perf_counter()
+    tokenizer, model = load_chat_model_from_path(model_path)
+    startup_timings["chat_load_s"] = time.perf_counter() - started
+    print(f"✅ Car chat model loaded and warm ({INFERENCE_PRECISION}) in {startup_timings['chat_load_s']:.1f}s")
+    
+    draft = None
+    if CHAT_DRAFT_MODEL_PATH:
+        started = time.perf_counter()
+        draft = load_draft_model(CHAT_DRAFT_MODEL_PATH, tokenizer, model)
+        if draft is not None:
+            startup_timings["chat_draft_load_s"] = time.perf_counter() - started
+            print(f"✅ Draft model {CHAT_DRAFT_MODEL_PATH} loaded for assisted generation "
+                  f"({CHAT_NUM_ASSISTANT_TOKENS} tokens per step) in {startup_timings['chat_draft_load_s']:.1f}s")
+    
+    engine = None
+    if CHAT_ENGINE_MAX_BATCH > 0 and draft is None:
+        engine = ContinuousBatchEngine(model, tokenizer, CHAT_ENGINE_MAX_BATCH, CHAT_TEMPERATURE,
+                                       max_queue=CHAT_ENGINE_MAX_QUEUE)
+        engine.start()
+        print(f"✅ Chat continuous batching started (≤ {CHAT_ENGINE_MAX_BATCH} sequences, "
+              f"≤ {CHAT_ENGINE_MAX_QUEUE} queued)")
+    
+    # Publish only once warm so no request pays for lazy kernel initialization
+    car_chat_tokenizer, car_chat_model, car_chat_draft_model, car_chat_engine = tokenizer, model, draft, engine
+
+def load_blip_model():
+    """Load BLIP for image captioning and warm the captioning and embedding paths"""
+    global blip_processor, blip_model, blip_onnx_captioner, blip_batcher
+    
+    started = time.perf_counter()
+    processor = BlipProcessor.from_pretrained(BLIP_MODEL_NAME)
+    model = apply_precision(BlipForConditionalGeneration.from_pretrained(BLIP_MODEL_NAME), INFERENCE_PRECISION)
+    
+    # Optional ONNX Runtime captioning; the torch model still serves embeddings
+    captioner = None
+    if BLIP_BACKEND == 'onnx':
+        captioner = OnnxBlipCaptioner(processor, model.config.text_config, BLIP_ONNX_DIR)
+        print(f"✅ BLIP ONNX backend loaded from {BLIP_ONNX_DIR}")
+    startup_timings["blip_load_s"] = time.perf_counter() - started
+    print(f"✅ BLIP model loaded ({INFERENCE_PRECISION}) in {startup_timings['blip_load_s']:.1f}s")
+    
+    # Put the batching scheduler in front of BLIP captioning
+    batcher = BlipBatcher(
+        processor, model, BLIP_MAX_BATCH_SIZE, BLIP_MAX_WAIT_MS,
+        caption_fn=captioner.caption if captioner is not None else None
+    )
+    batcher.start()
+    print(f"✅ BLIP batcher started (batch ≤ {BLIP_MAX_BATCH_SIZE}, wait ≤ {BLIP_MAX_WAIT_MS}ms)")
+    
+    started = time.perf_counter()
+    warm_image = Image.new('RGB', (IMAGE_TARGET_SIZE, IMAGE_TARGET_SIZE), (128, 128, 128))
+    batcher.caption(warm_image)
+    embed_image(warm_image, processor, model)
+    startup_timings["blip_warmup_s"] = time.perf_counter() - started
+    print(f"🔥 BLIP warm in {startup_timings['blip_warmup_s']:.1f}s")
+    
+    blip_processor, blip_model, blip_onnx_captioner, blip_batcher = processor, model, captioner, batcher
+
 def load_models():
-    """Load all trained models"""
-    global car_chat_model, car_chat_tokenizer, blip_processor, blip_model
+    """Load all trained models concurrently, warm them, then load indexes and caches"""
+    global car_index, phash_index, token_index, analysis_cache, precomputed_store, models_version
     
     print("🚗 Loading ML models...")
     
     try:
-        # Load your trained car chat model
-        model_path = './simple_car_chat_model'
-        if os.path.exists(model_path):
-            car_chat_tokenizer = AutoTokenizer.from_pretrained(model_path)
-            car_chat_model = AutoModelForCausalLM.from_pretrained(model_path)
-            print("✅ Car chat model loaded")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="model-load") as pool:
+            loads = [pool.submit(load_chat_model), pool.submit(load_blip_model)]
+            for load in loads:
+                load.result()
+        startup_timings["models_s"] = time.perf_counter() - started
+        
+        # Load the offline-built catalog embedding index
+        if os.path.exists(CAR_INDEX_PATH):
+            car_index = CarEmbeddingIndex.load(CAR_INDEX_PATH)
+            print(f"✅ Car embedding index loaded ({len(car_index)} images)")
+        else:
+            print("⚠️ Car embedding index not found, run car_embedding_index.py to build it")
+        
+        # Load the perceptual hash table for known collection artwork
+        if os.path.exists(CAR_PHASH_PATH):
+            phash_index = PerceptualHashIndex.load(CAR_PHASH_PATH)
+            print(f"✅ Perceptual hash index loaded ({len(phash_index)} images)")
+        else:
+            print("⚠️ Perceptual hash index not found, run phash_index.py to build it")
+        
+        # Load the token -> UUID map so known tokens skip recognition
+        if os.path.exists(TOKEN_INDEX_PATH):
+            token_index = TokenIndex.load(TOKEN_INDEX_PATH)
+            print(f"✅ Token index loaded ({len(token_index)} tokens)")
         else:
-            print("⚠️ Car chat model not found, using fallback")
+            print("⚠️ Token index not found, run token_index.py to build it")
         
-        # Load BLIP for image captioning
-        blip_processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-        blip_model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
-        print("✅ BLIP model loaded")
+        # Cache entries are only valid for the exact models that produced them
+        models_version = model_identity()
+        prefix_kv_cache.clear()
+        analysis_cache = AnalysisCache(models_version, ANALYSIS_CACHE_PATH or None, ANALYSIS_CACHE_MAX_ITEMS)
+        print(f"✅ Analysis cache ready (version {analysis_cache.version[:12]})")
+        
+        if os.path.exists(PRECOMPUTED_STORE_PATH):
+            precomputed_store = PrecomputedStore(models_version, PRECOMPUTED_STORE_PATH)
+            count = precomputed_store.load(catalog_car_info)
+            print(f"✅ Precomputed analyses loaded ({count} entries matching the catalog)")
+        else:
+            print("⚠️ Precomputed analyses not found, run precompute_analyses.py to build them")
+        
+        startup_timings["cold_start_s"] = time.perf_counter() - PROCESS_STARTED
+        print(f"⏱️ Cold start {startup_timings['cold_start_s']:.1f}s "
+              f"(models loaded + warm in {startup_timings['models_s']:.1f}s)")
         
     except Exception as e:
         print(f"❌ Error loading models: {e}")
         raise
 
-def analyze_car_image(image: Image.Image) -> Dict[str, Any]:
+def initialize_models():
+    """Background startup: load models, then flip readiness"""
+    global startup_error
+    try:
+        load_models()
+        models_ready.set()
+        print("✅ NFT Car ML API ready")
+    except Exception as e:
+        startup_error = str(e)
+
+def require_chat_model(name: Optional[str]):
+    """Reject requests for chat models that are not configured"""
+    if not is_known_chat_model(name):
+        raise HTTPException(status_code=404, detail=f"Unknown chat model '{name}'")
+
+def require_ready():
+    """Fail fast while models are still loading or warming up"""
+    if not models_ready.is_set():
+        detail = f"Model loading failed: {startup_error}" if startup_error else "Models are warming up"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+
+def model_identity() -> str:
+    """Fingerprint of the loaded models, used to version cached results"""
+    parts = [
+        f"blip={BLIP_MODEL_NAME}",
+        f"chat={CAR_CHAT_MODEL_PATH if car_chat_model is not None else 'none'}",
+        f"precision={INFERENCE_PRECISION}",
+        f"blip_backend={BLIP_BACKEND}",
+        f"input_size={IMAGE_TARGET_SIZE}"
+    ]
+    if car_chat_model is not None and os.path.isdir(CAR_CHAT_MODEL_PATH):
+        for name in sorted(os.listdir(CAR_CHAT_MODEL_PATH)):
+            stat = os.stat(os.path.join(CAR_CHAT_MODEL_PATH, name))
+            parts.append(f"{name}:{stat.st_size}:{int(stat.st_mtime)}")
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+def analyze_car_image(image: Image.Image, fingerprint: Optional[str] = None) -> Dict[str, Any]:
     """Analyze car image using BLIP model"""
     try:
-        inputs = blip_processor(image, return_tensors="pt")
-        out = blip_model.generate(**inputs, max_length=50)
-        caption = blip_processor.decode(out[0], skip_special_tokens=True)
-        
-        return {
-            "caption": caption,
-            "image_size": image.size,
-            "format": image.format
-        }
+        if analysis_cache is not None and fingerprint is not None:
+            cached = analysis_cache.get("caption", fingerprint)
+            if cached is not None:
+                return cached
+        
+        with stage("blip_generate"):
+            if blip_batcher is not None:
+                caption = blip_batcher.caption(image)
+            elif blip_onnx_captioner is not None:
+                caption = blip_onnx_captioner.caption([image])[0]
+            else:
+                inputs = match_model_dtype(blip_processor(image, return_tensors="pt"), blip_model)
+                out = blip_model.generate(**inputs, max_length=50)
+                caption = blip_processor.decode(out[0], skip_special_tokens=True)
+        
+        return caption_analysis(image, caption, fingerprint)
     except Exception as e:
         return {"error": str(e)}
 
-def recognize_car_from_image(image) -> Dict[str, Any]:
-    """Recognize car from image using filename matching"""
+def caption_analysis(image: Image.Image, caption: str, fingerprint: Optional[str] = None) -> Dict[str, Any]:
+    """Build (and cache) the BLIP analysis for a captioned image"""
+    analysis = {
+        "caption": caption,
+        "image_size": list(image.info.get('original_size', image.size)),
+        "format": image.format
+    }
+    if analysis_cache is not None and fingerprint is not None:
+        analysis_cache.put("caption", fingerprint, analysis)
+    return analysis
+
+def analyze_car_images(images: List[Image.Image], fingerprints: List[str]) -> List[Dict[str, Any]]:
+    """Batched analyze_car_image: every cache miss is queued on the BLIP batcher at once"""
+    if blip_batcher is None:
+        return [analyze_car_image(image, fingerprint) for image, fingerprint in zip(images, fingerprints)]
+    
+    results = [None] * len(images)
+    misses = []
+    for i, fingerprint in enumerate(fingerprints):
+        cached = analysis_cache.get("caption", fingerprint) if analysis_cache is not None else None
+        if cached is not None:
+            results[i] = cached
+        else:
+            misses.append(i)
+    
+    with stage("blip_generate"):
+        futures = [(i, blip_batcher.submit(images[i])) for i in misses]
+        for i, future in futures:
+            try:
+                results[i] = caption_analysis(images[i], future.result(), fingerprints[i])
+            except Exception as e:
+                results[i] = {"error": str(e)}
+    return results
+
+def catalog_car_info(uuid: str) -> Optional[Dict[str, Any]]:
+    record = car_catalog.get_by_uuid(uuid)
+    return record.to_info() if record is not None else None
+
+def lookup_car_by_uuid(uuid: str) -> Optional[Dict[str, Any]]:
+    """Fetch a catalog row by UUID as car_info"""
+    with stage("catalog_lookup"):
+        return catalog_car_info(uuid)
+
+def refresh_precomputed():
+    """Drop precomputed analyses whose car no longer matches the (reloaded) catalog"""
+    if precomputed_store is not None:
+        count = precomputed_store.load(catalog_car_info)
+        print(f"🔄 Precomputed analyses checked against the catalog ({count} entries still valid)")
+
+def resolve_token_car(request) -> Optional[Dict[str, Any]]:
+    """Catalog car_info for a known (collection_address, token_id), without touching the image"""
+    if token_index is None or len(token_index) == 0:
+        return None
+    with stage("token_lookup"):
+        uuid = token_index.lookup(request.collection_address, request.token_id)
+        car_info = lookup_car_by_uuid(uuid) if uuid is not None else None
+    if car_info is not None:
+        car_info["match_method"] = "token_id"
+    return car_info
+
+def match_phash(image) -> Optional[Dict[str, Any]]:
+    """Fast path: known collection artwork resolves by Hamming distance, no models"""
+    if phash_index is None or len(phash_index) == 0:
+        return None
+    with stage("phash_lookup"):
+        hit = phash_index.lookup(image, CAR_PHASH_MAX_DISTANCE)
+    if hit is None:
+        return None
+    row, distance = hit
+    car_info = lookup_car_by_uuid(phash_index.uuids[row])
+    if car_info is not None:
+        car_info["match_method"] = "phash"
+        car_info["hash_distance"] = distance
+    return car_info
+
+def match_embedding(query) -> Optional[Dict[str, Any]]:
+    """Score an image embedding against every catalog image"""
+    matches = car_index.search(query, top_k=CAR_MATCH_TOP_K)
+    if not matches or matches[0][1] < CAR_MATCH_MIN_SCORE:
+        return None
+    
+    best_row, best_score = matches[0]
+    car_info = lookup_car_by_uuid(car_index.uuids[best_row])
+    if car_info is not None:
+        car_info["match_method"] = "embedding"
+        car_info["similarity"] = best_score
+        car_info["matches"] = [
+            {
+                "uuid": car_index.uuids[row],
+                "filename": car_index.filenames[row],
+                "similarity": score
+            }
+            for row, score in matches
+        ]
+    return car_info
+
+def identify_car(image) -> Optional[Dict[str, Any]]:
+    """Catalog match via perceptual hash, then the embedding index; None when nothing matches"""
+    car_info = match_phash(image)
+    if car_info is not None or car_index is None or len(car_index) == 0:
+        return car_info
+    
+    # Embed the upload once and score it against every catalog image
+    with stage("embedding_search"):
+        return match_embedding(embed_image(image, blip_processor, blip_model))
+
+def recognize_car_from_image(image, fingerprint: Optional[str] = None) -> Dict[str, Any]:
+    """Recognize car from image via perceptual hash, then the embedding index"""
     try:
-        # For now, we'll use a simple approach - match by image hash or filename
-        # In a full implementation, you'd use your trained car recognition model
+        car_info = identify_car(image)
+        if car_info is not None:
+            return car_info
         
-        # Get image hash for matching
-        import hashlib
-        image_bytes = io.BytesIO()
-        image.save(image_bytes, format='PNG')
-        image_hash = hashlib.md5(image_bytes.getvalue()).hexdigest()
+        # Fallback to BLIP analysis
+        return analyze_car_image(image, fingerprint)
         
-        # Load car database
-        import pandas as pd
+    except Exception as e:
+        print(f"Error in car recognition: {e}")
+        return analyze_car_image(image, fingerprint)
+
+def run_parallel(fn: Callable, items: List[Any]) -> List[tuple]:
+    """Map fn over items on the batch pool, returning (result, error) per item in order"""
+    futures = [batch_pool.submit(contextvars.copy_context().run, fn, item) for item in items]
+    outcomes = []
+    for future in futures:
         try:
-            car_db = pd.read_csv('car_database_export.csv')
+            outcomes.append((future.result(), None))
+        except Exception as e:
+            outcomes.append((None, e))
+    return outcomes
+
+def recognize_car_batch(images: List[Image.Image], fingerprints: List[str]) -> List[Dict[str, Any]]:
+    """Recognize many images with one embedding pass per chunk and batched BLIP captioning"""
+    results = [None] * len(images)
+    pending = []
+    for i, image in enumerate(images):
+        try:
+            results[i] = match_phash(image)
+        except Exception as e:
+            print(f"Error in car recognition: {e}")
+        if results[i] is None:
+            pending.append(i)
+    
+    if pending and car_index is not None and len(car_index) > 0:
+        unmatched = []
+        for start in range(0, len(pending), BLIP_MAX_BATCH_SIZE):
+            chunk = pending[start:start + BLIP_MAX_BATCH_SIZE]
+            try:
+                with stage("embedding_search"):
+                    queries = embed_images([images[i] for i in chunk], blip_processor, blip_model)
+                    for i, query in zip(chunk, queries):
+                        results[i] = match_embedding(query)
+            except Exception as e:
+                print(f"Error in car recognition: {e}")
+            unmatched.extend(i for i in chunk if results[i] is None)
+        pending = unmatched
+    
+    for i, analysis in zip(pending, analyze_car_images([images[i] for i in pending],
+                                                       [fingerprints[i] for i in pending])):
+        results[i] = analysis
+    return results
+
+# Per-request match details that must not leak into the shared chat prefix
+VOLATILE_CAR_INFO_KEYS = {"similarity", "matches", "hash_distance", "match_method"}
+
+def build_chat_prompt(user_message: str, car_info: Dict[str, Any]):
+    """Split the chat prompt into a per-car prefix and a per-question suffix"""
+    stable_info = {k: v for k, v in car_info.items() if k not in VOLATILE_CAR_INFO_KEYS}
+    car_info_json = json.dumps(stable_info, sort_keys=True)
+    return f"Car Info: {car_info_json}\n", f"User: {user_message}\nAssistant:"
+
+# draft (assisted generation) and engine (continuous batching) exist only for the default chat model
+ChatModelHandle = namedtuple('ChatModelHandle', ['name', 'tokenizer', 'model', 'draft', 'engine'],
+                             defaults=(None, None))
+
+def is_known_chat_model(name: Optional[str]) -> bool:
+    return not name or name == DEFAULT_CHAT_MODEL or name in chat_model_registry
+
+@contextmanager
+def chat_model_lease(name: Optional[str] = None):
+    """Yield the requested chat model; non-default models come from the registry"""
+    if not name or name == DEFAULT_CHAT_MODEL:
+        yield ChatModelHandle(DEFAULT_CHAT_MODEL, car_chat_tokenizer, car_chat_model,
+                              car_chat_draft_model, car_chat_engine)
+        return
+    with chat_model_registry.use(name) as (tokenizer, model):
+        yield ChatModelHandle(name, tokenizer, model)
+
+def chat_cache_key(model_name: str, prefix: str, suffix: str) -> str:
+    """Analysis cache key for a chat answer"""
+    if model_name == DEFAULT_CHAT_MODEL:
+        return prefix + suffix
+    return f"{model_name}\0{prefix}{suffix}"
+
+def encode_chat_prompt(prefix: str, suffix: str, car_uuid: Optional[str] = None,
+                       handle: Optional[ChatModelHandle] = None):
+    """Tokenize the prompt, reusing cached past_key_values for the car prefix"""
+    if handle is None:
+        handle = ChatModelHandle(DEFAULT_CHAT_MODEL, car_chat_tokenizer, car_chat_model)
+    suffix_ids = handle.tokenizer.encode(suffix, return_tensors="pt")
+    prefix_ids = handle.tokenizer.encode(prefix, return_tensors="pt")
+    # Catalog cars share one entry per UUID; unrecognised images key on the prefix text
+    car_key = car_uuid if car_uuid and car_uuid != 'Unknown' else hashlib.sha256(prefix.encode()).hexdigest()
+    cache_key = (car_key, f"{models_version or ''}:{handle.name}")
+    prefix_ids, past_key_values = prefix_kv_cache.get_or_build(cache_key, prefix_ids, handle.model)
+    return torch.cat([prefix_ids, suffix_ids], dim=1), past_key_values
+
+# Text that opens a new conversation turn; generation stops there and replies are cut before it
+TURN_MARKERS = ("User:", "Assistant:", "Car Info:")
+
+CHAT_UNAVAILABLE = "I can see this is a car, but my specialized knowledge isn't available right now."
+
+GenerationBudget = namedtuple('GenerationBudget', ['max_new_tokens', 'deadline'])
+ChatReply = namedtuple('ChatReply', ['text', 'new_tokens', 'stop_reason'])
+
+def generation_budget(max_new_tokens: Optional[int] = None, deadline_ms: Optional[float] = None) -> GenerationBudget:
+    """Clamp a token budget and turn a relative deadline into an absolute perf_counter() time"""
+    tokens = min(max(1, max_new_tokens or CHAT_MAX_NEW_TOKENS), CHAT_MAX_NEW_TOKENS_LIMIT)
+    deadline = time.perf_counter() + deadline_ms / 1000.0 if deadline_ms else None
+    return GenerationBudget(tokens, deadline)
+
+def request_budget(request) -> GenerationBudget:
+    """Generation budget of a request, measured from its arrival"""
+    return generation_budget(request.max_new_tokens, request.deadline_ms)
+
+def generation_info(reply: ChatReply) -> Dict[str, Any]:
+    return {"new_tokens": reply.new_tokens, "stop_reason": reply.stop_reason}
+
+def is_cacheable(reply: ChatReply, budget: GenerationBudget) -> bool:
+    """Only complete answers may be cached; deadline- or budget-truncated ones may not"""
+    if reply.stop_reason in ("eos", "turn_marker"):
+        return True
+    return reply.stop_reason == "max_new_tokens" and budget.max_new_tokens >= CHAT_MAX_NEW_TOKENS
+
+def cut_at_turn_marker(text: str) -> str:
+    """Keep only the assistant's own turn"""
+    end = len(text)
+    for marker in TURN_MARKERS:
+        index = text.find(marker)
+        if index != -1:
+            end = min(end, index)
+    return text[:end]
+
+def record_chat_tokens(model_name: str, new_tokens: int, elapsed: float):
+    """Count generated tokens and observe tokens/sec"""
+    CHAT_TOKENS.inc(new_tokens, chat_model=model_name)
+    if elapsed > 0 and new_tokens > 0:
+        CHAT_TOKENS_PER_SECOND.observe(new_tokens / elapsed, chat_model=model_name)
+
+def opens_new_turn(tokenizer, new_ids, window: int = 8) -> bool:
+    """True once the last few generated tokens contain a turn marker"""
+    tail = tokenizer.decode(new_ids[-window:], skip_special_tokens=True)
+    return any(marker in tail for marker in TURN_MARKERS)
+
+class TurnMarkerCriteria(StoppingCriteria):
+    """Stop once every sequence has opened a new turn or emitted EOS"""
+    
+    def __init__(self, tokenizer, prompt_length: int, window: int = 8):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.window = window
+        self.marker_rows = set()
+        self.eos_rows = set()
+    
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        for row, ids in enumerate(input_ids):
+            if row in self.marker_rows or row in self.eos_rows:
+                continue
+            new_ids = ids[self.prompt_length:]
+            if len(new_ids) and int(new_ids[-1]) == self.tokenizer.eos_token_id:
+                self.eos_rows.add(row)
+                continue
+            if opens_new_turn(self.tokenizer, new_ids, self.window):
+                self.marker_rows.add(row)
+        return len(self.marker_rows) + len(self.eos_rows) == len(input_ids)
+
+class DeadlineCriteria(StoppingCriteria):
+    """Stop when the request's wall-clock deadline passes"""
+    
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self.triggered = False
+    
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        self.triggered = self.triggered or time.perf_counter() >= self.deadline
+        return self.triggered
+
+class CancelledCriteria(StoppingCriteria):
+    """Stop generation as soon as the client has gone away"""
+    
+    def __init__(self, cancel_event: threading.Event):
+        self.cancel_event = cancel_event
+    
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.cancel_event.is_set()
+
+class PendingChat:
+    """A chat reply still decoding in the continuous batch. Pipelines return it from their
+    inference worker and the event loop awaits it (see run_inference), so no worker is
+    parked while the batch decodes. finish(future) runs once the engine future is done."""
+    
+    def __init__(self, future, finish: Callable):
+        self.future = future
+        self.finish = finish
+    
+    def then(self, fn: Callable) -> 'PendingChat':
+        """Continue with fn(result) once the reply is ready"""
+        finish = self.finish
+        return PendingChat(self.future, lambda future: fn(finish(future)))
+
+def and_then(result, fn: Callable):
+    """fn(result) now, or once the reply is ready when result is a PendingChat"""
+    return result.then(fn) if isinstance(result, PendingChat) else fn(result)
+
+def submit_chat(handle: ChatModelHandle, inputs, budget: GenerationBudget, past_key_values=None,
+                streamer=None, cancel_event: Optional[threading.Event] = None):
+    """Join the running decode batch at the next token boundary; the Future resolves to (new_ids, interrupt_reason).
+    Raises ExecutorSaturated when the batch and its queue are full."""
+    return handle.engine.submit(inputs, budget.max_new_tokens, past_key_values, budget.deadline, cancel_event,
+                                lambda ids: opens_new_turn(handle.tokenizer, ids), streamer)
+
+def chat_generate(handle: ChatModelHandle, inputs, attention_mask, budget: GenerationBudget,
+                  past_key_values=None, streamer=None, cancel_event: Optional[threading.Event] = None):
+    """Sample within the budget, stopping at turn markers/EOS; returns (new_ids, interrupt_reason)"""
+    started = time.perf_counter()
+    with stage("chat_generate"):
+        if handle.engine is not None and inputs.shape[0] == 1:
+            new_ids, interrupt_reason = submit_chat(handle, inputs, budget, past_key_values, streamer,
+                                                    cancel_event).result()
+            new_ids = new_ids.unsqueeze(0)
+        else:
+            new_ids, interrupt_reason = model_generate(handle, inputs, attention_mask, budget, past_key_values,
+                                                       streamer, cancel_event)
+    record_chat_tokens(handle.name, int((new_ids != handle.tokenizer.eos_token_id).sum()),
+                       time.perf_counter() - started)
+    return new_ids, interrupt_reason
+
+def model_generate(handle: ChatModelHandle, inputs, attention_mask, budget: GenerationBudget,
+                   past_key_values=None, streamer=None, cancel_event: Optional[threading.Event] = None):
+    """One generate() call for this request (or static batch) alone"""
+    prompt_length = inputs.shape[1]
+    criteria = [TurnMarkerCriteria(handle.tokenizer, prompt_length)]
+    deadline_criteria = None
+    if budget.deadline is not None:
+        deadline_criteria = DeadlineCriteria(budget.deadline)
+        criteria.append(deadline_criteria)
+    if cancel_event is not None:
+        criteria.append(CancelledCriteria(cancel_event))
+    
+    # Assisted generation verifies draft tokens against the chat model's own
+    # distribution (speculative sampling), but only supports one sequence at a time
+    assistant_model = handle.draft if inputs.shape[0] == 1 else None
+    
+    with torch.no_grad():
+        outputs = handle.model.generate(
+            inputs,
+            attention_mask=attention_mask,
+            past_key_values=past_key_values,
+            assistant_model=assistant_model,
+            max_new_tokens=budget.max_new_tokens,
+            num_return_sequences=1,
+            temperature=CHAT_TEMPERATURE,
+            do_sample=True,
+            pad_token_id=handle.tokenizer.eos_token_id,
+            eos_token_id=handle.tokenizer.eos_token_id,
+            streamer=streamer,
+            stopping_criteria=StoppingCriteriaList(criteria)
+        )
+    new_ids = outputs[:, prompt_length:]
+    
+    interrupt_reason = None
+    if cancel_event is not None and cancel_event.is_set():
+        interrupt_reason = "cancelled"
+    elif deadline_criteria is not None and deadline_criteria.triggered:
+        interrupt_reason = "deadline"
+    return new_ids, interrupt_reason
+
+def finish_reply(tokenizer, new_ids, max_new_tokens: int, interrupt_reason: Optional[str] = None) -> ChatReply:
+    """Decode one generated row, cut it at the next turn and work out why it stopped"""
+    ids = new_ids.tolist()[:max_new_tokens]
+    eos_hit = tokenizer.eos_token_id in ids
+    if eos_hit:
+        ids = ids[:ids.index(tokenizer.eos_token_id) + 1]
+    text = tokenizer.decode(ids, skip_special_tokens=True)
+    reply = cut_at_turn_marker(text)
+    if len(reply) < len(text):
+        stop_reason = "turn_marker"
+    elif eos_hit:
+        stop_reason = "eos"
+    elif len(ids) >= max_new_tokens:
+        stop_reason = "max_new_tokens"
+    else:
+        stop_reason = interrupt_reason or "max_new_tokens"
+    CHAT_STOP_REASONS.inc(reason=stop_reason)
+    return ChatReply(reply.strip(), len(ids), stop_reason)
+
+def chat_error_reply(error: Exception) -> ChatReply:
+    return ChatReply(f"I'm having trouble analyzing this car right now: {str(error)}", 0, "error")
+
+def chat_reply_or_error(finish: Callable, future) -> ChatReply:
+    """finish(future), turning a failed decode into an error reply as the blocking path does"""
+    try:
+        return finish(future)
+    except Exception as e:
+        return chat_error_reply(e)
+
+def store_chat_reply(handle: ChatModelHandle, new_ids, interrupt_reason: Optional[str], cache_key: str,
+                     budget: GenerationBudget) -> ChatReply:
+    """Finish one generated row and cache it when complete"""
+    reply = finish_reply(handle.tokenizer, new_ids, budget.max_new_tokens, interrupt_reason)
+    if analysis_cache is not None and is_cacheable(reply, budget):
+        analysis_cache.put("chat", cache_key, reply.text)
+    return reply
+
+def defer_chat_reply(handle: ChatModelHandle, inputs, past_key_values, cache_key: str, budget: GenerationBudget,
+                     streamer=None, cancel_event: Optional[threading.Event] = None,
+                     on_finish: Optional[Callable] = None) -> PendingChat:
+    """Submit to the continuous batch and return without waiting; the reply is finished by the awaiter"""
+    started = time.perf_counter()
+    
+    def finish(future) -> ChatReply:
+        if on_finish is not None:
+            on_finish()
+        new_ids, interrupt_reason = future.result()
+        record_chat_tokens(handle.name, int((new_ids != handle.tokenizer.eos_token_id).sum()),
+                           time.perf_counter() - started)
+        return store_chat_reply(handle, new_ids, interrupt_reason, cache_key, budget)
+    
+    return PendingChat(submit_chat(handle, inputs, budget, past_key_values, streamer, cancel_event), finish)
+
+def generate_car_chat_reply(user_message: str, car_info: Dict[str, Any], chat_model: Optional[str] = None,
+                            budget: Optional[GenerationBudget] = None, defer: bool = False):
+    """Generate a reply with the car chat model, reporting tokens generated and the stop reason.
+    With defer, a reply that joins the continuous batch comes back as a PendingChat."""
+    budget = budget or generation_budget()
+    try:
+        with chat_model_lease(chat_model) as handle:
+            if handle.model is None or handle.tokenizer is None:
+                return ChatReply(CHAT_UNAVAILABLE, 0, "unavailable")
             
-            # For Summertime Blues, we know the filename
-            # In a real implementation, you'd match by image similarity
-            summertime_match = car_db[car_db['filename'].str.contains('Summertime Blues', na=False)]
+            # Create context with car info; the car prefix comes first so its KV cache is shared
+            prefix, suffix = build_chat_prompt(user_message, car_info)
             
-            if not summertime_match.empty:
-                car_data = summertime_match.iloc[0]
-                return {
-                    "make": car_data.get('make', 'Unknown'),
-                    "model": car_data.get('model', 'Unknown'),
-                    "year": car_data.get('year', 'Unknown'),
-                    "type": car_data.get('type', 'Unknown'),
-                    "color": car_data.get('color', 'Unknown'),
-                    "description": car_data.get('description', 'No description available'),
-                    "uuid": car_data.get('uuid', 'Unknown'),
-                    "filename": car_data.get('filename', 'Unknown')
-                }
-        except Exception as e:
-            print(f"Error loading car database: {e}")
-        
-        # Fallback to BLIP analysis
-        return analyze_car_image(image)
+            cache_key = chat_cache_key(handle.name, prefix, suffix)
+            if analysis_cache is not None:
+                cached = analysis_cache.get("chat", cache_key)
+                if cached is not None:
+                    return ChatReply(cached, 0, "cached")
+            
+            # Tokenize input, encoding only the question suffix when the car prefix is cached
+            inputs, past_key_values = encode_chat_prompt(prefix, suffix, car_info.get("uuid"), handle)
+            
+            if defer and handle.engine is not None:
+                # The default model holds no registry lease, so the reply may outlive this block
+                pending = defer_chat_reply(handle, inputs, past_key_values, cache_key, budget)
+                return PendingChat(pending.future, lambda future: chat_reply_or_error(pending.finish, future))
+            
+            # Generate response
+            new_ids, interrupt_reason = chat_generate(handle, inputs, torch.ones_like(inputs), budget, past_key_values)
+            return store_chat_reply(handle, new_ids[0], interrupt_reason, cache_key, budget)
         
+    except ExecutorSaturated:
+        # A full chat batch is overload, answered with a 503 like a full inference queue
+        raise
     except Exception as e:
-        print(f"Error in car recognition: {e}")
-        return analyze_car_image(image)
+        return chat_error_reply(e)
 
-def generate_car_chat_response(user_message: str, car_info: Dict[str, Any]) -> str:
+def generate_car_chat_response(user_message: str, car_info: Dict[str, Any], chat_model: Optional[str] = None,
+                               budget: Optional[GenerationBudget] = None) -> str:
     """Generate response using your trained car chat model"""
+    return generate_car_chat_reply(user_message, car_info, chat_model, budget).text
+
+def generate_car_chat_responses(items: List[tuple], chat_model: Optional[str] = None) -> List[ChatReply]:
+    """Answer many (user_message, car_info, budget) items together: through the continuous batch
+    when it is running, otherwise with batched, left-padded generate calls"""
     try:
-        if car_chat_model is None or car_chat_tokenizer is None:
-            return "I can see this is a car, but my specialized knowledge isn't available right now."
-        
-        # Create context with car info
-        context = f"User: {user_message}\nCar Info: {json.dumps(car_info)}\nAssistant:"
-        
-        # Tokenize input
-        inputs = car_chat_tokenizer.encode(context, return_tensors="pt")
-        
-        # Generate response
-        with torch.no_grad():
-            outputs = car_chat_model.generate(
-                inputs,
-                max_length=inputs.shape[1] + 100,
-                num_return_sequences=1,
-                temperature=0.7,
-                do_sample=True,
-                pad_token_id=car_chat_tokenizer.eos_token_id
-            )
+        with chat_model_lease(chat_model) as handle:
+            if handle.model is None or handle.tokenizer is None:
+                return [ChatReply(CHAT_UNAVAILABLE, 0, "unavailable")] * len(items)
+            
+            replies = [None] * len(items)
+            todo = []
+            for i, (user_message, car_info, budget) in enumerate(items):
+                prefix, suffix = build_chat_prompt(user_message, car_info)
+                cache_key = chat_cache_key(handle.name, prefix, suffix)
+                cached = analysis_cache.get("chat", cache_key) if analysis_cache is not None else None
+                if cached is not None:
+                    replies[i] = ChatReply(cached, 0, "cached")
+                else:
+                    todo.append((i, prefix + suffix, cache_key, budget or generation_budget()))
+            
+            generated = []
+            if handle.engine is not None:
+                # Every item joins the continuous batch and leaves it at its own budget
+                started = time.perf_counter()
+                with stage("chat_generate"):
+                    futures = [
+                        handle.engine.submit(handle.tokenizer.encode(prompt, return_tensors="pt"),
+                                             budget.max_new_tokens, deadline=budget.deadline,
+                                             stop_fn=lambda ids: opens_new_turn(handle.tokenizer, ids),
+                                             wait=True)
+                        for _, prompt, _, budget in todo
+                    ]
+                    generated = [(item, *future.result()) for item, future in zip(todo, futures)]
+                record_chat_tokens(handle.name,
+                                   sum(int((row != handle.tokenizer.eos_token_id).sum()) for _, row, _ in generated),
+                                   time.perf_counter() - started)
+            else:
+                pad_token_id = handle.tokenizer.eos_token_id
+                for start in range(0, len(todo), CHAT_BATCH_SIZE):
+                    chunk = todo[start:start + CHAT_BATCH_SIZE]
+                    encoded = [handle.tokenizer.encode(prompt) for _, prompt, _, _ in chunk]
+                    width = max(len(ids) for ids in encoded)
+                    # Left-pad so every sequence continues from its own last prompt token
+                    input_ids = torch.tensor([[pad_token_id] * (width - len(ids)) + ids for ids in encoded])
+                    attention_mask = torch.tensor([[0] * (width - len(ids)) + [1] * len(ids) for ids in encoded])
+                
+                    # The batch runs to the largest budget; each row is trimmed to its own afterwards
+                    budgets = [budget for _, _, _, budget in chunk]
+                    deadlines = [budget.deadline for budget in budgets]
+                    chunk_budget = GenerationBudget(
+                        max(budget.max_new_tokens for budget in budgets),
+                        None if None in deadlines else max(deadlines)
+                    )
+                    new_ids, interrupt_reason = chat_generate(handle, input_ids, attention_mask, chunk_budget)
+                    generated.extend((item, row, interrupt_reason) for item, row in zip(chunk, new_ids))
+            
+            for (i, _, cache_key, budget), row, interrupt_reason in generated:
+                replies[i] = finish_reply(handle.tokenizer, row, budget.max_new_tokens, interrupt_reason)
+                if analysis_cache is not None and is_cacheable(replies[i], budget):
+                    analysis_cache.put("chat", cache_key, replies[i].text)
+            return replies
         
-        # Decode response
-        response = car_chat_tokenizer.decode(outputs[0], skip_special_tokens=True)
-        assistant_response = response.split("Assistant:")[-1].strip()
+    except Exception as e:
+        return [chat_error_reply(e)] * len(items)
+
+class CallbackStreamer(TextStreamer):
+    """Forward decoded text chunks to a callback as generate() produces them"""
+    
+    def __init__(self, tokenizer, on_text):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.on_text = on_text
+    
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.on_text(text)
+
+class TurnMarkerFilter:
+    """Pass streamed text through up to the first turn marker, holding back a possible partial marker"""
+    
+    def __init__(self, on_text):
+        self.on_text = on_text
+        self.text = ""
+        self.sent = 0
+        self.stopped = False
+    
+    def feed(self, chunk: str):
+        if self.stopped:
+            return
+        self.text += chunk
+        reply = cut_at_turn_marker(self.text)
+        if len(reply) < len(self.text):
+            self.stopped = True
+            self._send(len(reply))
+        else:
+            self._send(len(self.text) - self._partial_marker_length())
+    
+    def flush(self):
+        if not self.stopped:
+            self._send(len(self.text))
+    
+    def _partial_marker_length(self) -> int:
+        """Length of the longest text suffix that could still grow into a turn marker"""
+        longest = 0
+        for marker in TURN_MARKERS:
+            for size in range(min(len(marker) - 1, len(self.text)), longest, -1):
+                if self.text.endswith(marker[:size]):
+                    longest = size
+                    break
+        return longest
+    
+    def _send(self, end: int):
+        if end > self.sent:
+            self.on_text(self.text[self.sent:end])
+            self.sent = end
+
+def stream_car_chat_response(user_message: str, car_info: Dict[str, Any], on_text,
+                             cancel_event: threading.Event, chat_model: Optional[str] = None,
+                             budget: Optional[GenerationBudget] = None, defer: bool = False):
+    """Generate a chat response token by token, calling on_text for each chunk.
+    With defer, a reply that joins the continuous batch comes back as a PendingChat."""
+    budget = budget or generation_budget()
+    with chat_model_lease(chat_model) as handle:
+        if handle.model is None or handle.tokenizer is None:
+            on_text(CHAT_UNAVAILABLE)
+            return ChatReply(CHAT_UNAVAILABLE, 0, "unavailable")
         
-        return assistant_response
+        prefix, suffix = build_chat_prompt(user_message, car_info)
+        cache_key = chat_cache_key(handle.name, prefix, suffix)
+        if analysis_cache is not None:
+            cached = analysis_cache.get("chat", cache_key)
+            if cached is not None:
+                on_text(cached)
+                return ChatReply(cached, 0, "cached")
         
-    except Exception as e:
-        return f"I'm having trouble analyzing this car right now: {str(e)}"
+        inputs, past_key_values = encode_chat_prompt(prefix, suffix, car_info.get("uuid"), handle)
+        text_filter = TurnMarkerFilter(on_text)
+        streamer = CallbackStreamer(handle.tokenizer, text_filter.feed)
+        if defer and handle.engine is not None:
+            return defer_chat_reply(handle, inputs, past_key_values, cache_key, budget, streamer, cancel_event,
+                                    on_finish=text_filter.flush)
+        
+        new_ids, interrupt_reason = chat_generate(
+            handle, inputs, torch.ones_like(inputs), budget, past_key_values,
+            streamer=streamer, cancel_event=cancel_event
+        )
+        text_filter.flush()
+        return store_chat_reply(handle, new_ids[0], interrupt_reason, cache_key, budget)
+
+def reinit_after_fork():
+    """Recreate per-process threads and SQLite connections in a worker forked from a loaded parent
+    (prefork_server.py stops the parent's scheduler threads before forking)"""
+    global analysis_cache
+    if blip_batcher is not None:
+        blip_batcher.restart()
+    if car_chat_engine is not None:
+        car_chat_engine.restart()
+    if analysis_cache is not None:
+        analysis_cache = AnalysisCache(models_version, ANALYSIS_CACHE_PATH or None, ANALYSIS_CACHE_MAX_ITEMS)
+
+async def watch_catalog():
+    """Reload the catalog in this process whenever its CSV changes, so every worker serves the same batch"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(CATALOG_WATCH_INTERVAL_S)
+        try:
+            count = await loop.run_in_executor(None, car_catalog.reload_if_changed)
+            if count is not None:
+                print(f"🔄 Car catalog changed on disk, reloaded ({count} cars)")
+                await loop.run_in_executor(None, refresh_precomputed)
+        except Exception as e:
+            print(f"❌ Error reloading car catalog: {e}")
 
 @app.on_event("startup")
 async def startup_event():
-    """Load models on startup"""
-    load_models()
+    """Load catalog, then load and warm models in the background"""
+    global catalog_watcher
+    # Started per process: uvicorn --workers and prefork_server.py workers each hold their own catalog
+    if CATALOG_WATCH_INTERVAL_S > 0:
+        catalog_watcher = asyncio.create_task(watch_catalog())
+    # Workers forked by prefork_server.py inherit a loaded catalog and warm models
+    if models_ready.is_set():
+        return
+    try:
+        count = car_catalog.load()
+        print(f"✅ Car catalog loaded ({count} cars)")
+    except Exception as e:
+        print(f"❌ Error loading car catalog: {e}")
+    threading.Thread(target=initialize_models, name="model-startup", daemon=True).start()
+
+def _cache_hit_ratios():
+    ratios = {}
+    if analysis_cache is not None:
+        ratios[("analysis",)] = analysis_cache.stats()["hit_ratio"]
+    if token_index is not None:
+        ratios[("token",)] = token_index.stats()["hit_rate"]
+    if phash_index is not None:
+        ratios[("phash",)] = phash_index.stats()["hit_rate"]
+    if precomputed_store is not None:
+        ratios[("precomputed",)] = precomputed_store.stats()["hit_rate"]
+    prefix_stats = prefix_kv_cache.stats()
+    prefix_lookups = prefix_stats["hits"] + prefix_stats["misses"]
+    ratios[("prefix_kv",)] = prefix_stats["hits"] / prefix_lookups if prefix_lookups else 0.0
+    return ratios
+
+def _queue_depths():
+    depths = {("inference_executor",): inference_executor.stats()["queued"]}
+    if blip_batcher is not None:
+        depths[("blip_batcher",)] = blip_batcher.stats()["pending"]
+    if car_chat_engine is not None:
+        depths[("chat_engine",)] = car_chat_engine.stats()["pending"]
+    return depths
+
+metrics.register(Gauge('nft_ml_in_flight_requests', 'HTTP requests currently being served',
+                       collect=lambda: {(): http_in_flight}))
+metrics.register(Gauge('nft_ml_inference_running', 'Inference tasks currently running on workers',
+                       collect=lambda: {(): inference_executor.stats()["running"]}))
+metrics.register(Gauge('nft_ml_queue_depth', 'Work waiting for an inference worker, BLIP batch or chat batch slot', ['queue'],
+                       collect=_queue_depths))
+def _rejected_requests():
+    rejected = {("inference_executor",): inference_executor.stats()["rejected"]}
+    if car_chat_engine is not None:
+        rejected[("chat_engine",)] = car_chat_engine.stats()["rejected"]
+    return rejected
+
+metrics.register(Counter('nft_ml_inference_rejected_total',
+                         'Requests rejected because the inference or chat batch queue was full', ['queue'],
+                         collect=_rejected_requests))
+metrics.register(Gauge('nft_ml_model_load_seconds', 'Model load, warmup and cold start durations', ['phase'],
+                       collect=lambda: {(phase,): value for phase, value in startup_timings.items()}))
+metrics.register(Gauge('nft_ml_cache_hit_ratio', 'Hit ratio of each cache / fast path', ['cache'],
+                       collect=_cache_hit_ratios))
+
+@app.middleware("http")
+async def upload_size_middleware(request: Request, call_next):
+    """Reject oversized uploads from Content-Length, before the multipart body is received and spooled.
+    Chunked uploads carry no length and are checked by spool_upload as they stream."""
+    if request.url.path == "/analyze-nft/upload" and request.method == "POST":
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > MAX_UPLOAD_BYTES + MAX_UPLOAD_OVERHEAD_BYTES:
+            return JSONResponse(status_code=413, content={"detail": f"Image exceeds {MAX_UPLOAD_BYTES} bytes"})
+    return await call_next(request)
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """Record request latency and attach a per-stage Server-Timing header.
+    Latency and in-flight count cover the whole body, so streamed answers are measured until their last chunk."""
+    global http_in_flight
+    timings = {}
+    token = request_timings.set(timings)
+    with http_in_flight_lock:
+        http_in_flight += 1
+    started = time.perf_counter()
+    
+    def finish(status: int):
+        global http_in_flight
+        with http_in_flight_lock:
+            http_in_flight -= 1
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - started, path=path, status=status)
+    
+    try:
+        response = await call_next(request)
+    except BaseException:
+        finish(500)
+        raise
+    finally:
+        request_timings.reset(token)
+    response.headers["Server-Timing"] = server_timing_header(timings, time.perf_counter() - started)
+    
+    body = response.body_iterator
+    async def observed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish(response.status_code)
+    response.body_iterator = observed_body()
+    return response
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root():
     """Health check endpoint"""
     return {"message": "NFT Car ML API is running! 🚗🤖"}
 
+def decode_image_base64(image_base64: str) -> bytes:
+    """Decode a (possibly data-URL prefixed) base64 payload into raw image bytes"""
+    with stage("base64_decode"):
+        return base64.b64decode(image_base64.split(',')[1] if ',' in image_base64 else image_base64)
+
+def open_model_image(source) -> Image.Image:
+    """Open an image lazily and decode it at model input size, enforcing MAX_IMAGE_PIXELS"""
+    with stage("image_decode"):
+        try:
+            return prepare_image(Image.open(source), IMAGE_TARGET_SIZE, MAX_IMAGE_PIXELS)
+        except Image.DecompressionBombError as e:
+            # PIL refuses images over twice its limit while reading the header
+            raise ImageTooLarge(str(e)) from e
+
+def run_nft_recognition(request: NFTRequest) -> Dict[str, Any]:
+    """Blocking decode + recognition; runs on an inference worker"""
+    # Decode base64 image at the resolution the models need
+    image_data = decode_image_base64(request.image_base64)
+    image = open_model_image(io.BytesIO(image_data))
+    
+    # Recognize car from image using trained data
+    return recognize_car_from_image(image, content_fingerprint(image_data))
+
+def run_nft_analysis(request: NFTRequest, budget: Optional[GenerationBudget] = None):
+    """Blocking analysis pipeline; runs on an inference worker (see run_inference)"""
+    image_data = decode_image_base64(request.image_base64)
+    fingerprint = content_fingerprint(image_data)
+    
+    # Catalog artwork with a precomputed question is answered without decoding the image
+    entry = lookup_precomputed(request, fingerprint=fingerprint)
+    if entry is not None:
+        return precomputed_response(dict(entry["car_info"], match_method="precomputed"), entry, request)
+    
+    image = open_model_image(io.BytesIO(image_data))
+    car_info = recognize_car_from_image(image, fingerprint)
+    
+    # Recognised catalog cars can still reuse the precomputed answer
+    return run_known_car_analysis(request, car_info, budget)
+
+def run_known_car_analysis(request: NFTRequest, car_info: Dict[str, Any],
+                           budget: Optional[GenerationBudget] = None):
+    """Chat-only pipeline for a car that is already identified"""
+    entry = lookup_precomputed(request, uuid=car_info.get("uuid"))
+    if entry is not None:
+        return precomputed_response(car_info, entry, request)
+    return build_ml_response(car_info, request.user_message, request.token_id, request.chat_model, budget)
+
+def precomputed_response(car_info: Dict[str, Any], entry: Dict[str, Any], request: NFTRequest) -> MLResponse:
+    return assemble_ml_response(car_info, entry["chat_response"], request.token_id, request.chat_model,
+                                {"new_tokens": 0, "stop_reason": "precomputed"})
+
+def lookup_precomputed(request: NFTRequest, fingerprint: Optional[str] = None,
+                       uuid: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Precomputed analysis for this image or car and question (default chat model only)"""
+    if precomputed_store is None or (request.chat_model or DEFAULT_CHAT_MODEL) != DEFAULT_CHAT_MODEL:
+        return None
+    with stage("precomputed_lookup"):
+        if fingerprint is not None:
+            return precomputed_store.get_by_fingerprint(fingerprint, request.user_message)
+        return precomputed_store.get(uuid, request.user_message)
+
+# Tier outcomes that mean the answer is less than the full pipeline would give
+DEGRADED_TIER_OUTCOMES = {"skipped", "truncated", "failed"}
+PRECOMPUTED_TIERS = {"catalog": "ran", "caption": "precomputed", "chat": "precomputed"}
+
+def catalog_summary(car_info: Dict[str, Any]) -> str:
+    """Answer built from catalog fields (or the caption) when the chat tier does not run"""
+    name = " ".join(str(car_info[key]) for key in ("year", "make", "model")
+                    if car_info.get(key) and car_info[key] != 'Unknown')
+    if name:
+        description = car_info.get("description")
+        if description and description != 'No description available':
+            return f"This is a {name}. {description}"
+        return f"This is a {name}."
+    if car_info.get("caption"):
+        return f"This looks like {car_info['caption']}."
+    return "I can see this is a car, but I couldn't identify it in our catalog."
+
+def cached_chat_reply(user_message: str, car_info: Dict[str, Any], chat_model: Optional[str] = None) -> Optional[str]:
+    """A previously generated chat answer, found without touching the model"""
+    if analysis_cache is None:
+        return None
+    prefix, suffix = build_chat_prompt(user_message, car_info)
+    return analysis_cache.get("chat", chat_cache_key(chat_model or DEFAULT_CHAT_MODEL, prefix, suffix))
+
+def mark_tiers(response: MLResponse, tiers: Dict[str, str], budget: GenerationBudget) -> MLResponse:
+    """Record which tiers ran and how much of the latency budget was left"""
+    for tier, outcome in tiers.items():
+        TIER_OUTCOMES.inc(tier=tier, outcome=outcome)
+    response.ml_insights["tiers"] = tiers
+    response.ml_insights["degraded"] = any(outcome in DEGRADED_TIER_OUTCOMES for outcome in tiers.values())
+    response.ml_insights["budget_remaining_ms"] = max(0.0, 1000.0 * (budget.deadline - time.perf_counter()))
+    return response
+
+def run_tiered_analysis(request: NFTRequest, car_info: Optional[Dict[str, Any]],
+                        budget: GenerationBudget):
+    """Latency-budgeted pipeline; runs on an inference worker. The catalog answer always
+    comes back; the BLIP caption and then the chat answer are added only while each is
+    expected to finish before the deadline"""
+    tiers = {}
+    image = fingerprint = blip_analysis = None
+    
+    # Tier 1: catalog match (token index, perceptual hash, embedding index)
+    started = time.perf_counter()
+    if car_info is None:
+        image_data = decode_image_base64(request.image_base64)
+        fingerprint = content_fingerprint(image_data)
+        entry = lookup_precomputed(request, fingerprint=fingerprint)
+        if entry is not None:
+            response = precomputed_response(dict(entry["car_info"], match_method="precomputed"), entry, request)
+            return mark_tiers(response, PRECOMPUTED_TIERS, budget)
+        image = open_model_image(io.BytesIO(image_data))
+        try:
+            car_info = identify_car(image)
+        except Exception as e:
+            print(f"Error in car recognition: {e}")
+        tier_latency.observe("catalog", time.perf_counter() - started)
+    tiers["catalog"] = "ran" if car_info is not None else "no_match"
+    if car_info is not None:
+        entry = lookup_precomputed(request, uuid=car_info.get("uuid"))
+        if entry is not None:
+            return mark_tiers(precomputed_response(car_info, entry, request), PRECOMPUTED_TIERS, budget)
+    
+    # Tier 2: BLIP caption
+    if image is None:
+        # Identified by token ID without decoding the image, as in the full pipeline
+        tiers["caption"] = "not_needed"
+    else:
+        blip_analysis = analysis_cache.get("caption", fingerprint) if analysis_cache is not None else None
+        if blip_analysis is not None:
+            tiers["caption"] = "cached"
+        elif tier_latency.fits("caption", budget.deadline - time.perf_counter()):
+            started = time.perf_counter()
+            blip_analysis = analyze_car_image(image, fingerprint)
+            tier_latency.observe("caption", time.perf_counter() - started)
+            tiers["caption"] = "failed" if "error" in blip_analysis else "ran"
+        else:
+            tiers["caption"] = "skipped"
+            tier_latency.skipped("caption")
+    if car_info is None:
+        # Unrecognised images are described by their caption, as in the full pipeline
+        car_info = blip_analysis or {}
+    
+    def respond(chat_response: str, generation: Optional[Dict[str, Any]] = None) -> MLResponse:
+        response = assemble_ml_response(car_info, chat_response, request.token_id, request.chat_model, generation)
+        if blip_analysis is not None and tiers["catalog"] == "ran":
+            response.ml_insights["blip_analysis"] = blip_analysis
+        return mark_tiers(response, tiers, budget)
+    
+    # Tier 3: chat answer, cut off at the deadline if it runs long
+    chat_response = cached_chat_reply(request.user_message, car_info, request.chat_model)
+    if chat_response is not None:
+        tiers["chat"] = "cached"
+        return respond(chat_response)
+    if not tier_latency.fits("chat", budget.deadline - time.perf_counter()):
+        tiers["chat"] = "skipped"
+        tier_latency.skipped("chat")
+        return respond(catalog_summary(car_info))
+    
+    started = time.perf_counter()
+    
+    def chat_tier(reply: ChatReply) -> MLResponse:
+        if reply.stop_reason in ("error", "unavailable"):
+            tiers["chat"] = "failed"
+        elif reply.stop_reason == "deadline":
+            tiers["chat"] = "truncated"
+        else:
+            tiers["chat"] = "ran"
+            tier_latency.observe("chat", time.perf_counter() - started)
+        chat_response = reply.text if tiers["chat"] != "failed" and reply.text else catalog_summary(car_info)
+        return respond(chat_response, generation_info(reply))
+    
+    return and_then(generate_car_chat_reply(request.user_message, car_info, request.chat_model, budget, defer=True),
+                    chat_tier)
+
+def run_upload_analysis(image_file, fingerprint: str, user_message: str, token_id: str,
+                        chat_model: Optional[str] = None, budget: Optional[GenerationBudget] = None):
+    """Blocking pipeline for multipart uploads; PIL decodes straight from the spool_upload file"""
+    image = open_model_image(image_file)
+    car_info = recognize_car_from_image(image, fingerprint)
+    return build_ml_response(car_info, user_message, token_id, chat_model, budget)
+
+def build_ml_response(car_info: Dict[str, Any], user_message: str, token_id: str,
+                      chat_model: Optional[str] = None, budget: Optional[GenerationBudget] = None):
+    """Generate the chat answer and assemble the /analyze-nft response (a PendingChat while it decodes)"""
+    # Generate chat response
+    reply = generate_car_chat_reply(user_message, car_info, chat_model, budget, defer=True)
+    return and_then(reply, lambda reply: assemble_ml_response(car_info, reply.text, token_id, chat_model,
+                                                              generation_info(reply)))
+
+def assemble_ml_response(car_info: Dict[str, Any], chat_response: str, token_id: str,
+                         chat_model: Optional[str] = None, generation: Optional[Dict[str, Any]] = None) -> MLResponse:
+    """Wrap recognition and chat results in an MLResponse"""
+    # Prepare ML insights
+    ml_insights = {
+        "model_used": "BLIP + Custom Car Chat",
+        "chat_model": chat_model or DEFAULT_CHAT_MODEL,
+        "analysis_timestamp": str(torch.cuda.EventTime() if torch.cuda.is_available() else "CPU"),
+        "image_analysis": car_info,
+        "generation": generation
+    }
+    
+    return MLResponse(
+        success=True,
+        car_info=car_info,
+        ml_insights=ml_insights,
+        chat_response=chat_response,
+        token_id=token_id
+    )
+
+def decode_batch_item(request: NFTRequest):
+    """Decode one batch item; returns (image, fingerprint)"""
+    if not request.image_base64:
+        raise ValueError("image_base64 is required for tokens that are not in the token index")
+    image_data = decode_image_base64(request.image_base64)
+    return open_model_image(io.BytesIO(image_data)), content_fingerprint(image_data)
+
+def batch_item_error(index: int, request: NFTRequest, error: Exception) -> Dict[str, Any]:
+    return {"index": index, "success": False, "token_id": request.token_id, "error": str(error)}
+
+def run_nft_batch(requests: List[NFTRequest], budgets: Optional[List[GenerationBudget]] = None,
+                  on_result: Optional[Callable] = None,
+                  cancel_event: Optional[threading.Event] = None) -> List[Dict[str, Any]]:
+    """Blocking batch pipeline: parallel decode, batched recognition/BLIP, batched chat"""
+    results = [None] * len(requests)
+    budgets = budgets or [generation_budget() for _ in requests]
+    
+    def emit(index: int, result: Dict[str, Any]):
+        results[index] = result
+        if on_result is not None:
+            on_result(result)
+    
+    # Known tokens skip decoding and recognition entirely
+    recognized, unknown = [], []
+    for i, request in enumerate(requests):
+        car_info = resolve_token_car(request)
+        if car_info is not None:
+            recognized.append((i, car_info))
+        else:
+            unknown.append(i)
+    
+    # Decode the other images in parallel; a bad image fails only its own item
+    decoded = []
+    outcomes = run_parallel(decode_batch_item, [requests[i] for i in unknown])
+    for i, (item, error) in zip(unknown, outcomes):
+        if error is not None:
+            emit(i, batch_item_error(i, requests[i], error))
+        else:
+            image, fingerprint = item
+            decoded.append((i, image, fingerprint))
+    
+    car_infos = recognize_car_batch([image for _, image, _ in decoded], [fp for _, _, fp in decoded])
+    recognized.extend((i, car_info) for (i, _, _), car_info in zip(decoded, car_infos))
+    
+    # Chat generation is batched per chat model
+    groups = {}
+    for i, car_info in recognized:
+        groups.setdefault(requests[i].chat_model or DEFAULT_CHAT_MODEL, []).append((i, car_info))
+    for chat_model, members in groups.items():
+        for start in range(0, len(members), CHAT_BATCH_SIZE):
+            if cancel_event is not None and cancel_event.is_set():
+                return results
+            chunk = members[start:start + CHAT_BATCH_SIZE]
+            replies = generate_car_chat_responses(
+                [(requests[i].user_message, car_info, budgets[i]) for i, car_info in chunk], chat_model
+            )
+            for (i, car_info), reply in zip(chunk, replies):
+                response = assemble_ml_response(car_info, reply.text, requests[i].token_id, chat_model,
+                                                generation_info(reply))
+                emit(i, {"index": i, **response.dict()})
+    return results
+
+def require_image(request: NFTRequest):
+    if not request.image_base64:
+        raise HTTPException(status_code=400, detail="image_base64 is required for tokens that are not in the token index")
+
+def coalescing_key(fingerprint: str, user_message: Optional[str], chat_model: Optional[str],
+                   budget: GenerationBudget):
+    return (fingerprint, user_message or "", chat_model or DEFAULT_CHAT_MODEL, budget.max_new_tokens)
+
+def payload_key(request: NFTRequest) -> str:
+    """Hash of the encoded image, so duplicates are detected before any decoding"""
+    payload = request.image_base64.split(',')[1] if ',' in request.image_base64 else request.image_base64
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+async def run_inference(fn, *args, **kwargs):
+    """Run fn on the inference executor, then await on the event loop any chat it left
+    decoding in the continuous batch, so the worker is free for the next request"""
+    result = await inference_executor.run(fn, *args, **kwargs)
+    if isinstance(result, PendingChat):
+        with stage("chat_generate"):
+            # wait() rather than await: finish() sees a failed decode through future.result()
+            await asyncio.wait([asyncio.wrap_future(result.future)])
+        # finish() decodes tokens and writes the SQLite cache, so it stays off the event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, contextvars.copy_context().run, result.finish, result.future)
+    return result
+
+async def coalesced_analysis(endpoint: str, key, token_id: str, fn, *args) -> MLResponse:
+    """Run fn on the inference executor once per key; followers get the leader's result"""
+    return await coalesced(endpoint, key, token_id, lambda: run_inference(fn, *args))
+
+async def coalesced(endpoint: str, key, token_id: str, work) -> MLResponse:
+    """Await work() once per key; followers get the leader's result"""
+    response, shared = await request_coalescer.run(key, work)
+    if not shared:
+        return response
+    COALESCED_REQUESTS.inc(endpoint=endpoint)
+    # Editions share artwork, so a follower may be asking about a different token
+    return response.copy(update={"token_id": token_id})
+
+async def tiered_analysis(request: NFTRequest, car_info: Optional[Dict[str, Any]],
+                          budget: GenerationBudget) -> MLResponse:
+    """Run the tiered pipeline; a known token still gets its catalog answer when every worker is busy"""
+    identity = f"uuid:{car_info['uuid']}" if car_info is not None else payload_key(request)
+    # Only share with requests holding the same latency budget: a follower with a tighter one would
+    # wait past its deadline, and one with a looser one would get a needlessly degraded answer
+    deadline_ms = request.deadline_ms or ANALYZE_LATENCY_BUDGET_MS
+    key = coalescing_key(identity, request.user_message, request.chat_model, budget) + ("tiered", deadline_ms)
+    try:
+        return await coalesced_analysis("/analyze-nft", key, request.token_id,
+                                        run_tiered_analysis, request, car_info, budget)
+    except ExecutorSaturated:
+        if car_info is None:
+            raise
+        response = assemble_ml_response(car_info, catalog_summary(car_info), request.token_id, request.chat_model)
+        return mark_tiers(response, {"catalog": "ran", "caption": "not_needed", "chat": "skipped"}, budget)
+
 @app.post("/analyze-nft", response_model=MLResponse)
 async def analyze_nft(request: NFTRequest):
     """Analyze NFT image with ML models"""
+    budget = generation_budget(request.max_new_tokens, request.deadline_ms or ANALYZE_LATENCY_BUDGET_MS or None)
+    require_ready()
+    require_chat_model(request.chat_model)
+    # Known tokens: a dict lookup, then chat only (or a precomputed answer without any inference)
+    car_info = resolve_token_car(request)
+    if car_info is None:
+        require_image(request)
     try:
-        # Decode base64 image
-        image_data = base64.b64decode(request.image_base64.split(',')[1] if ',' in request.image_base64 else request.image_base64)
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Recognize car from image using trained data
-        car_info = recognize_car_from_image(image)
-        
-        # Generate chat response
-        chat_response = generate_car_chat_response(request.user_message, car_info)
-        
-        # Prepare ML insights
-        ml_insights = {
-            "model_used": "BLIP + Custom Car Chat",
-            "analysis_timestamp": str(torch.cuda.EventTime() if torch.cuda.is_available() else "CPU"),
-            "image_analysis": car_info
-        }
-        
-        return MLResponse(
-            success=True,
-            car_info=car_info,
-            ml_insights=ml_insights,
-            chat_response=chat_response,
-            token_id=request.token_id
-        )
+        if car_info is not None:
+            entry = lookup_precomputed(request, uuid=car_info["uuid"])
+            if entry is not None:
+                response = precomputed_response(car_info, entry, request)
+                return response if budget.deadline is None else mark_tiers(response, PRECOMPUTED_TIERS, budget)
+        
+        # A latency budget switches to the tiered pipeline
+        if budget.deadline is not None:
+            return await tiered_analysis(request, car_info, budget)
+        
+        if car_info is not None:
+            key = coalescing_key(f"uuid:{car_info['uuid']}", request.user_message, request.chat_model, budget)
+            return await coalesced_analysis("/analyze-nft", key, request.token_id,
+                                            run_known_car_analysis, request, car_info, budget)
+        
+        key = coalescing_key(payload_key(request), request.user_message, request.chat_model, budget)
+        return await coalesced_analysis("/analyze-nft", key, request.token_id, run_nft_analysis, request, budget)
         
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=f"Service busy: {str(e)}", headers={"Retry-After": "1"})
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+async def spool_upload(image: UploadFile):
+    """Hash the upload in chunks into a spool of our own, enforcing MAX_UPLOAD_BYTES; returns (spool, fingerprint).
+    A coalesced analysis may outlive the request that started it, so it must not read the request's upload."""
+    loop = asyncio.get_running_loop()
+    digest = hashlib.sha256()
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+    total = 0
+    try:
+        with stage("upload_read"):
+            while True:
+                chunk = await image.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if total > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Image exceeds {MAX_UPLOAD_BYTES} bytes")
+                digest.update(chunk)
+                await loop.run_in_executor(None, spool.write, chunk)
+        if total == 0:
+            raise HTTPException(status_code=400, detail="Empty image upload")
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, digest.hexdigest()
+
+@app.post("/analyze-nft/upload", response_model=MLResponse)
+async def analyze_nft_upload(
+    image: UploadFile = File(...),
+    token_id: str = Form(...),
+    collection_address: str = Form(...),
+    user_message: str = Form("Tell me about this car"),
+    chat_model: Optional[str] = Form(None),
+    max_new_tokens: Optional[int] = Form(None),
+    deadline_ms: Optional[float] = Form(None)
+):
+    """Analyze a multipart image upload (no base64 inflation)"""
+    budget = generation_budget(max_new_tokens, deadline_ms)
+    require_ready()
+    require_chat_model(chat_model)
+    request = NFTRequest(token_id=token_id, collection_address=collection_address, user_message=user_message,
+                         chat_model=chat_model, max_new_tokens=max_new_tokens, deadline_ms=deadline_ms)
+    # Known tokens: a dict lookup, then chat only; the upload is never read or decoded
+    car_info = resolve_token_car(request)
+    spool = None
+    try:
+        if car_info is not None:
+            entry = lookup_precomputed(request, uuid=car_info["uuid"])
+            if entry is not None:
+                return precomputed_response(car_info, entry, request)
+            key = coalescing_key(f"uuid:{car_info['uuid']}", user_message, chat_model, budget)
+            return await coalesced_analysis("/analyze-nft/upload", key, token_id,
+                                            run_known_car_analysis, request, car_info, budget)
+        
+        spool, fingerprint = await spool_upload(image)
+        await image.close()
+        
+        def analyze_spool():
+            # Only the leader's analysis runs; it owns the spool from here on and closes it when done,
+            # even if this request is cancelled while followers still wait on the shared result
+            nonlocal spool
+            owned, spool = spool, None
+            
+            async def work():
+                try:
+                    return await run_inference(run_upload_analysis, owned, fingerprint, user_message, token_id,
+                                               chat_model, budget)
+                finally:
+                    owned.close()
+            return work()
+        
+        return await coalesced("/analyze-nft/upload", coalescing_key(fingerprint, user_message, chat_model, budget),
+                               token_id, analyze_spool)
+        
+    except HTTPException:
+        # 413 / 400 from spool_upload
+        raise
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=f"Service busy: {str(e)}", headers={"Retry-After": "1"})
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    finally:
+        await image.close()
+        if spool is not None:
+            spool.close()
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/analyze-nft/stream")
+async def analyze_nft_stream(request: NFTRequest, http_request: Request):
+    """Analyze NFT image, sending car_info immediately and chat tokens over SSE"""
+    budget = request_budget(request)
+    require_ready()
+    require_chat_model(request.chat_model)
+    car_info = resolve_token_car(request)
+    if car_info is None:
+        require_image(request)
+    try:
+        if car_info is None:
+            car_info = await inference_executor.run(run_nft_recognition, request)
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=f"Service busy: {str(e)}", headers={"Retry-After": "1"})
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    
+    async def events():
+        loop = asyncio.get_running_loop()
+        tokens = asyncio.Queue()
+        cancel_event = threading.Event()
+        
+        def on_text(text: str):
+            loop.call_soon_threadsafe(tokens.put_nowait, text)
+        
+        yield sse_event("car_info", {"token_id": request.token_id, "car_info": car_info})
+        
+        generation = asyncio.ensure_future(run_inference(
+            stream_car_chat_response, request.user_message, car_info, on_text, cancel_event,
+            request.chat_model, budget, defer=True
+        ))
+        try:
+            while True:
+                if await http_request.is_disconnected():
+                    cancel_event.set()
+                    return
+                getter = asyncio.ensure_future(tokens.get())
+                done, _ = await asyncio.wait({getter, generation}, timeout=1.0,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    yield sse_event("token", {"text": getter.result()})
+                    continue
+                getter.cancel()
+                if generation in done:
+                    # Drain chunks queued just before generate() returned
+                    while not tokens.empty():
+                        yield sse_event("token", {"text": tokens.get_nowait()})
+                    try:
+                        reply = generation.result()
+                        yield sse_event("done", {"chat_response": reply.text, "generation": generation_info(reply)})
+                    except ExecutorSaturated as e:
+                        yield sse_event("error", {"detail": f"Service busy: {str(e)}"})
+                    except Exception as e:
+                        yield sse_event("error", {"detail": f"Chat generation failed: {str(e)}"})
+                    return
+        finally:
+            # Client disconnects surface here as cancellation of the response generator
+            cancel_event.set()
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/analyze-nft/batch")
+async def analyze_nft_batch(batch: NFTBatchRequest):
+    """Analyze many NFTs in one pipelined job; stream=true sends each result over SSE as it finishes"""
+    budgets = [request_budget(request) for request in batch.requests]
+    require_ready()
+    if not batch.requests:
+        raise HTTPException(status_code=400, detail="Empty batch")
+    if len(batch.requests) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_ITEMS} items")
+    for request in batch.requests:
+        require_chat_model(request.chat_model)
+    
+    if not batch.stream:
+        try:
+            results = await inference_executor.run(run_nft_batch, batch.requests, budgets)
+        except ExecutorSaturated as e:
+            raise HTTPException(status_code=503, detail=f"Service busy: {str(e)}", headers={"Retry-After": "1"})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Batch analysis failed: {str(e)}")
+        failed = sum(1 for result in results if not result["success"])
+        return {"success": failed == 0, "count": len(results), "failed": failed, "results": results}
+    
+    loop = asyncio.get_running_loop()
+    finished = asyncio.Queue()
+    cancel_event = threading.Event()
+    
+    def on_result(result: Dict[str, Any]):
+        loop.call_soon_threadsafe(finished.put_nowait, result)
+    
+    job = asyncio.ensure_future(inference_executor.run(run_nft_batch, batch.requests, budgets, on_result, cancel_event))
+    # Admission happens on the job's first step; surface saturation as a 503 before streaming starts
+    await asyncio.sleep(0)
+    if job.done() and isinstance(job.exception(), ExecutorSaturated):
+        raise HTTPException(status_code=503, detail=f"Service busy: {str(job.exception())}",
+                            headers={"Retry-After": "1"})
+    
+    async def events():
+        sent = failed = 0
+        try:
+            while sent < len(batch.requests):
+                getter = asyncio.ensure_future(finished.get())
+                done, _ = await asyncio.wait({getter, job}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    if finished.empty():
+                        detail = str(job.exception()) if job.exception() else "batch ended early"
+                        yield sse_event("error", {"detail": f"Batch analysis failed: {detail}"})
+                        return
+                    continue
+                result = getter.result()
+                sent += 1
+                failed += 0 if result["success"] else 1
+                yield sse_event("result", result)
+            yield sse_event("done", {"count": sent, "failed": failed})
+        finally:
+            cancel_event.set()
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/catalog/reload")
+async def reload_catalog():
+    """Atomically swap in a new catalog batch without restarting"""
+    # Always the configured CAR_CATALOG_PATH; the route must not read arbitrary server files.
+    # This reloads the worker that served the request; the others pick the change up via watch_catalog.
+    try:
+        count = car_catalog.reload()
+        refresh_precomputed()
+        return {"success": True, "cars": count, "source": car_catalog.csv_path}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Catalog reload failed: {str(e)}")
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 only once both models are loaded and warm"""
+    if not models_ready.is_set():
+        body = {"ready": False, "error": startup_error, "timings": startup_timings}
+        return JSONResponse(status_code=503, content=body)
+    return {"ready": True, "models_version": models_version, "timings": startup_timings}
+
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
     models_status = {
         "car_chat_model": car_chat_model is not None,
         "blip_model": blip_model is not None,
-        "models_loaded": all([car_chat_model, blip_model])
+        "models_loaded": all([car_chat_model, blip_model]),
+        "precision": INFERENCE_PRECISION,
+        "blip_backend": BLIP_BACKEND,
+        "chat_draft_model": CHAT_DRAFT_MODEL_PATH if car_chat_draft_model is not None else None
     }
     
     return {
         "status": "healthy" if models_status["models_loaded"] else "degraded",
         "models": models_status,
+        "catalog_size": len(car_catalog),
+        "token_fast_path": token_index.stats() if token_index is not None else None,
+        "phash_fast_path": phash_index.stats() if phash_index is not None else None,
+        "inference_executor": inference_executor.stats(),
+        "request_coalescing": request_coalescer.stats(),
+        "tier_latency": tier_latency.stats(),
+        "analysis_cache": analysis_cache.stats() if analysis_cache is not None else None,
+        "precomputed_analyses": precomputed_store.stats() if precomputed_store is not None else None,
+        "prefix_kv_cache": prefix_kv_cache.stats(),
+        "chat_model_registry": chat_model_registry.stats(),
+        "blip_batching": blip_batcher.stats() if blip_batcher is not None else None,
+        "chat_batching": car_chat_engine.stats() if car_chat_engine is not None else None,
         "message": "NFT Car ML API ready for action! 🚗💬"
     }
 
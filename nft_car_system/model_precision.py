@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Inference Precision Modes for CPU Serving
+fp32 (default), bf16, or dynamic int8 quantization of Linear layers
+"""
+
+import torch
+
+PRECISION_MODES = ("fp32", "bf16", "int8")
+
+
+def apply_precision(model, mode: str = "fp32"):
+    """Return the model converted to the requested inference precision"""
+    mode = (mode or "fp32").lower()
+    if mode not in PRECISION_MODES:
+        raise ValueError(f"Unknown precision mode '{mode}', expected one of {PRECISION_MODES}")
+    model.eval()
+    if mode == "bf16":
+        return model.to(torch.bfloat16)
+    if mode == "int8":
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def model_dtype(model) -> torch.dtype:
+    """Floating dtype the model expects for its float inputs"""
+    for param in model.parameters():
+        if param.is_floating_point():
+            return param.dtype
+    return torch.float32
+
+
+def match_model_dtype(inputs, model):
+    """Cast float tensors in a processor output (e.g. pixel_values) to the model's dtype"""
+    dtype = model_dtype(model)
+    for key, value in inputs.items():
+        if isinstance(value, torch.Tensor) and value.is_floating_point() and value.dtype != dtype:
+            inputs[key] = value.to(dtype)
+    return inputs
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Chat Model Registry
+Loads fine-tuned car chat models on demand by name, tracks their resident
+memory and evicts the least recently used ones above a RAM budget
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Tuple
+
+import torch
+
+
+def _tensors(value):
+    """Tensors in a state_dict value; quantized modules store (weight, bias) tuples of packed params"""
+    if isinstance(value, torch.Tensor):
+        yield value
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            yield from _tensors(item)
+
+
+def model_nbytes(model) -> int:
+    """Resident size of a model's weights and buffers, including int8 packed params
+    that parameters() does not see; tied weights are counted once"""
+    total, seen = 0, set()
+    for value in model.state_dict(keep_vars=True).values():
+        for tensor in _tensors(value):
+            if id(tensor) not in seen:
+                seen.add(id(tensor))
+                total += tensor.element_size() * tensor.nelement()
+    return total
+
+
+def parse_model_paths(spec: str = '', models_dir: str = '') -> Dict[str, str]:
+    """Model paths from "name=path,name2=path2" and/or one sub-directory per model"""
+    paths = {}
+    if models_dir and os.path.isdir(models_dir):
+        for name in sorted(os.listdir(models_dir)):
+            path = os.path.join(models_dir, name)
+            if os.path.isfile(os.path.join(path, 'config.json')):
+                paths[name] = path
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, path = item.split('=', 1)
+            paths[name.strip()] = path.strip()
+    return paths
+
+
+class _Entry:
+    __slots__ = ('tokenizer', 'model', 'nbytes', 'leases')
+
+    def __init__(self, tokenizer, model, nbytes: int):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.nbytes = nbytes
+        self.leases = 0
+
+
+class ChatModelRegistry:
+    """Named chat models with a shared memory budget and single-flight loading"""
+
+    def __init__(self, paths: Dict[str, str], budget_bytes: int, loader: Callable[[str], Tuple[Any, Any]]):
+        self.paths = dict(paths)
+        self.budget_bytes = budget_bytes
+        self.loader = loader
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.shared_loads = 0
+        self.evictions = 0
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.paths
+
+    def names(self):
+        return sorted(self.paths)
+
+    @contextmanager
+    def use(self, name: str):
+        """Lease (tokenizer, model) for the duration of a request; leased models are never evicted"""
+        entry = self._acquire(name)
+        try:
+            yield entry.tokenizer, entry.model
+        finally:
+            with self._lock:
+                entry.leases -= 1
+                self._evict()
+
+    def _acquire(self, name: str) -> _Entry:
+        while True:
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is not None:
+                    entry.leases += 1
+                    self._entries.move_to_end(name)
+                    return entry
+                if name not in self.paths:
+                    raise KeyError(f"Unknown chat model '{name}'")
+                future = self._loading.get(name)
+                owner = future is None
+                if owner:
+                    future = Future()
+                    self._loading[name] = future
+                else:
+                    self.shared_loads += 1
+
+            if not owner:
+                # Another request is already loading this model; wait for it, then lease
+                future.result()
+                continue
+
+            try:
+                tokenizer, model = self.loader(self.paths[name])
+            except Exception as e:
+                with self._lock:
+                    self._loading.pop(name, None)
+                future.set_exception(e)
+                raise
+            entry = _Entry(tokenizer, model, model_nbytes(model))
+            with self._lock:
+                entry.leases += 1
+                self._entries[name] = entry
+                self._loading.pop(name, None)
+                self.loads += 1
+                self._evict()
+            future.set_result(None)
+            return entry
+
+    def _resident_bytes(self) -> int:
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def _evict(self):
+        """Drop least recently used idle models until within budget (caller holds the lock)"""
+        while self._resident_bytes() > self.budget_bytes:
+            victim = next((name for name, entry in self._entries.items() if entry.leases == 0), None)
+            if victim is None:
+                return
+            del self._entries[victim]
+            self.evictions += 1
+            print(f"♻️ Evicted chat model '{victim}' to stay within memory budget")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "available": sorted(self.paths),
+                "resident": {
+                    name: {"bytes": entry.nbytes, "leases": entry.leases}
+                    for name, entry in self._entries.items()
+                },
+                "resident_bytes": self._resident_bytes(),
+                "budget_bytes": self.budget_bytes,
+                "loading": sorted(self._loading),
+                "loads": self.loads,
+                "shared_loads": self.shared_loads,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Perceptual Hash Index for NFT Car Images
+dHash table over the catalog held in a BK-tree, so known collection artwork
+resolves by Hamming distance without running any model
+"""
+
+import csv
+import os
+import threading
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from image_preprocess import prepare_image
+from car_embedding_index import resolve_image_path, DEFAULT_CSV_PATH, DEFAULT_IMAGE_ROOT
+
+DEFAULT_PHASH_PATH = 'car_phash_index.npz'
+HASH_SIZE = 8
+
+
+def dhash(image: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """Difference hash: compare horizontally adjacent pixels of a tiny grayscale thumbnail"""
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """Burkhard-Keller tree keyed on Hamming distance"""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value: int, item):
+        node = (value, item, {})
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, object]]:
+        """Return (distance, item) pairs within radius, closest first"""
+        if self.root is None:
+            return []
+        results = []
+        stack = [self.root]
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                results.append((distance, item))
+            for child_distance in range(distance - radius, distance + radius + 1):
+                child = children.get(child_distance)
+                if child is not None:
+                    stack.append(child)
+        results.sort(key=lambda pair: pair[0])
+        return results
+
+
+class PerceptualHashIndex:
+    """Catalog dHash table with a BK-tree and a fast-path hit counter"""
+
+    def __init__(self, hashes: List[int], uuids: List[str], filenames: List[str]):
+        self.hashes = list(hashes)
+        self.uuids = list(uuids)
+        self.filenames = list(filenames)
+        self.tree = BKTree()
+        for row, value in enumerate(self.hashes):
+            self.tree.add(value, row)
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_PHASH_PATH) -> 'PerceptualHashIndex':
+        """Load an index written by save()"""
+        data = np.load(path, allow_pickle=False)
+        return cls([int(h) for h in data['hashes']], data['uuids'].tolist(), data['filenames'].tolist())
+
+    def save(self, path: str = DEFAULT_PHASH_PATH):
+        """Persist the hash table as an .npz file"""
+        np.savez(
+            path,
+            hashes=np.array(self.hashes, dtype=np.uint64),
+            uuids=np.array(self.uuids),
+            filenames=np.array(self.filenames)
+        )
+
+    def lookup(self, image: Image.Image, max_distance: int) -> Optional[Tuple[int, int]]:
+        """Return (row, distance) of the closest catalog image within max_distance"""
+        matches = self.tree.search(dhash(image), max_distance)
+        with self._lock:
+            self.lookups += 1
+            if matches:
+                self.hits += 1
+        if not matches:
+            return None
+        distance, row = matches[0]
+        return row, distance
+
+    def stats(self) -> Dict[str, float]:
+        """Fast-path hit counters"""
+        with self._lock:
+            return {
+                "entries": len(self),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0
+            }
+
+
+def build_index(csv_path: str = DEFAULT_CSV_PATH, image_root: str = DEFAULT_IMAGE_ROOT) -> PerceptualHashIndex:
+    """Hash every catalog image that can be found on disk"""
+    with open(csv_path, newline='') as f:
+        rows = list(csv.DictReader(f))
+
+    hashes, uuids, filenames = [], [], []
+    for row in rows:
+        path = resolve_image_path(row, image_root)
+        if path is None:
+            print(f"⚠️ Image not found for {row.get('filename')}, skipping")
+            continue
+        with Image.open(path) as image:
+            hashes.append(dhash(prepare_image(image, max_pixels=0)))
+        uuids.append(row['uuid'])
+        filenames.append(row['filename'])
+
+    print(f"✅ Hashed {len(hashes)} of {len(rows)} catalog rows")
+    return PerceptualHashIndex(hashes, uuids, filenames)
+
+
+def main():
+    """Build the perceptual hash index offline"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the car perceptual hash index")
+    parser.add_argument('--csv', default=DEFAULT_CSV_PATH)
+    parser.add_argument('--image-root', default=os.getenv('CAR_IMAGE_ROOT', DEFAULT_IMAGE_ROOT))
+    parser.add_argument('--output', default=os.getenv('CAR_PHASH_PATH', DEFAULT_PHASH_PATH))
+    args = parser.parse_args()
+
+    print("🚗 Building car perceptual hash index...")
+    index = build_index(args.csv, args.image_root)
+    index.save(args.output)
+    print(f"💾 Saved index to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
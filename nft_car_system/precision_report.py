@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Accuracy-vs-latency report for the fp32 / bf16 / int8 inference precision modes
+Captions catalog images with BLIP and answers a fixed question set with the car
+chat model in each mode, scoring against the fp32 baseline and catalog facts
+"""
+
+import argparse
+import csv
+import json
+import os
+import statistics
+import time
+
+import torch
+from PIL import Image
+from transformers import AutoTokenizer, AutoModelForCausalLM, BlipProcessor, BlipForConditionalGeneration
+
+import ml_api_service as service
+from car_catalog import CarCatalog
+from car_embedding_index import resolve_image_path, DEFAULT_IMAGE_ROOT
+from image_preprocess import prepare_image
+from model_precision import apply_precision, match_model_dtype, PRECISION_MODES
+
+VEHICLE_WORDS = ("car", "truck", "wagon", "vehicle", "van", "suv", "coupe", "convertible", "bus", "jeep")
+
+
+def load_questions(dataset_path: str = 'car_chat_llm_dataset.csv', limit: int = 5):
+    """First distinct user questions from the chat training set"""
+    questions = []
+    with open(dataset_path, newline='') as f:
+        for row in csv.DictReader(f):
+            question = row['text'].split("\n")[0].replace("User:", "").strip()
+            if question and question not in questions:
+                questions.append(question)
+            if len(questions) >= limit:
+                break
+    return questions
+
+
+def word_overlap(a: str, b: str) -> float:
+    """Jaccard overlap of lowercase word sets"""
+    wa, wb = set(a.lower().split()), set(b.lower().split())
+    return len(wa & wb) / len(wa | wb) if wa | wb else 1.0
+
+
+def caption_images(images, processor, model):
+    captions, latencies = [], []
+    for image in images:
+        started = time.perf_counter()
+        inputs = match_model_dtype(processor(image, return_tensors="pt"), model)
+        with torch.no_grad():
+            out = model.generate(**inputs, max_length=50)
+        latencies.append(time.perf_counter() - started)
+        captions.append(processor.decode(out[0], skip_special_tokens=True))
+    return captions, latencies
+
+
+def answer_questions(cases, tokenizer, model):
+    answers, latencies = [], []
+    for question, car_info in cases:
+        prefix, suffix = service.build_chat_prompt(question, car_info)
+        inputs = tokenizer.encode(prefix + suffix, return_tensors="pt")
+        started = time.perf_counter()
+        with torch.no_grad():
+            outputs = model.generate(
+                inputs,
+                attention_mask=torch.ones_like(inputs),
+                max_new_tokens=60,
+                do_sample=False,
+                pad_token_id=tokenizer.eos_token_id
+            )
+        latencies.append(time.perf_counter() - started)
+        response = tokenizer.decode(outputs[0], skip_special_tokens=True)
+        answers.append(response.split("Assistant:")[-1].strip())
+    return answers, latencies
+
+
+def precision_report(image_root: str, num_cars: int, modes):
+    catalog = CarCatalog()
+    catalog.load()
+    paths = []
+    for r in catalog.records():
+        path = resolve_image_path({'filename': r.filename, 'image_path': r.image_path,
+                                   'batch_date': r.batch_date}, image_root)
+        if path is not None:
+            paths.append(path)
+    images = [prepare_image(Image.open(path), max_pixels=0) for path in paths[:num_cars]]
+    questions = load_questions()
+    chat_cars = catalog.records()[:num_cars]
+    cases = [(q, r.to_info()) for r in chat_cars for q in questions]
+
+    print(f"🖼️  {len(images)} catalog images, 💬 {len(cases)} chat cases")
+    results, baseline = {}, {}
+    processor = BlipProcessor.from_pretrained(service.BLIP_MODEL_NAME)
+    tokenizer = AutoTokenizer.from_pretrained(service.CAR_CHAT_MODEL_PATH)
+
+    for mode in modes:
+        print(f"\n🔧 Mode: {mode}")
+        blip = apply_precision(BlipForConditionalGeneration.from_pretrained(service.BLIP_MODEL_NAME), mode)
+        chat = apply_precision(AutoModelForCausalLM.from_pretrained(service.CAR_CHAT_MODEL_PATH), mode)
+
+        captions, caption_times = caption_images(images, processor, blip)
+        answers, answer_times = answer_questions(cases, tokenizer, chat)
+        if mode == "fp32" or not baseline:
+            baseline = {"captions": captions, "answers": answers}
+
+        results[mode] = {
+            "caption_ms_p50": 1000 * statistics.median(caption_times) if caption_times else None,
+            "caption_vehicle_rate": sum(
+                any(w in c.lower().split() for w in VEHICLE_WORDS) for c in captions
+            ) / max(1, len(captions)),
+            "caption_match_fp32": sum(
+                c == b for c, b in zip(captions, baseline["captions"])
+            ) / max(1, len(captions)),
+            "caption_overlap_fp32": statistics.mean(
+                [word_overlap(c, b) for c, b in zip(captions, baseline["captions"])] or [1.0]
+            ),
+            "chat_ms_p50": 1000 * statistics.median(answer_times) if answer_times else None,
+            "chat_manufacturer_rate": sum(
+                car_info["make"].lower() in a.lower() for a, (_, car_info) in zip(answers, cases)
+            ) / max(1, len(answers)),
+            "chat_overlap_fp32": statistics.mean(
+                [word_overlap(a, b) for a, b in zip(answers, baseline["answers"])] or [1.0]
+            )
+        }
+        print(json.dumps(results[mode], indent=2))
+        del blip, chat
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy vs latency per inference precision mode")
+    parser.add_argument('--image-root', default=os.getenv('CAR_IMAGE_ROOT', DEFAULT_IMAGE_ROOT))
+    parser.add_argument('--cars', type=int, default=20)
+    parser.add_argument('--modes', nargs='+', default=list(PRECISION_MODES), choices=PRECISION_MODES)
+    parser.add_argument('--output', default='precision_report.json')
+    args = parser.parse_args()
+
+    print("🚗 Building precision report...")
+    results = precision_report(args.image_root, args.cars, args.modes)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print("\n" + "=" * 70)
+    print(f"{'mode':6} {'caption ms':>11} {'vehicle':>8} {'=fp32':>7} {'chat ms':>9} {'make hit':>9}")
+    print("=" * 70)
+    for mode, r in results.items():
+        print(f"{mode:6} {r['caption_ms_p50'] or 0:11.1f} {r['caption_vehicle_rate']:8.2f} "
+              f"{r['caption_match_fp32']:7.2f} {r['chat_ms_p50'] or 0:9.1f} {r['chat_manufacturer_rate']:9.2f}")
+    print(f"\n💾 Saved report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Offline Precompute of Catalog Analyses
+Runs the live analyze_car_image + generate_car_chat_response pipeline over
+every catalog car on a process pool and stores the results in the
+precomputed store that /analyze-nft serves from first. Interrupted runs
+resume where they stopped.
+
+Run with the same model/precision environment as the service, otherwise the
+model version differs and the service ignores the results.
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from analysis_cache import content_fingerprint
+from car_catalog import CarCatalog, DEFAULT_CSV_PATH
+from car_embedding_index import resolve_image_path, DEFAULT_IMAGE_ROOT
+from precomputed_store import PrecomputedStore, DEFAULT_STORE_PATH, DEFAULT_QUESTION
+
+service = None
+
+
+def init_worker(csv_path: str, threads: int):
+    """Load the service models once per worker process"""
+    global service
+    import torch
+    torch.set_num_threads(threads)
+    import ml_api_service
+    service = ml_api_service
+    service.car_catalog.load(csv_path)
+    service.load_models()
+
+
+def worker_version() -> str:
+    return service.models_version
+
+
+def analyze_catalog_car(uuid: str, path: str, questions):
+    """Full pipeline for one catalog image; returns (uuid, fingerprint, {question: entry})"""
+    with open(path, 'rb') as f:
+        image_data = f.read()
+    fingerprint = content_fingerprint(image_data)
+    image = service.open_model_image(io.BytesIO(image_data))
+
+    blip_analysis = service.analyze_car_image(image, fingerprint)
+    car_info = service.lookup_car_by_uuid(uuid)
+    entries = {}
+    for question in questions:
+        entries[question] = {
+            "car_info": car_info,
+            "blip_analysis": blip_analysis,
+            "chat_response": service.generate_car_chat_response(question, car_info)
+        }
+    return uuid, fingerprint, entries
+
+
+def precompute(csv_path: str = DEFAULT_CSV_PATH, image_root: str = DEFAULT_IMAGE_ROOT,
+               store_path: str = DEFAULT_STORE_PATH, questions=(DEFAULT_QUESTION,), workers: int = 2):
+    """Analyse every catalog car not yet in the store"""
+    catalog = CarCatalog(csv_path)
+    catalog.load()
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker,
+                             initargs=(csv_path, threads)) as pool:
+        print(f"🚗 Loading models in {workers} workers ({threads} threads each)...")
+        version = pool.submit(worker_version).result()
+        store = PrecomputedStore(version, store_path)
+
+        done = {question: store.completed(question) for question in questions}
+        tasks, missing = [], 0
+        for record in catalog.records():
+            if not record.uuid:
+                continue
+            todo = [q for q in questions if record.uuid not in done[q]]
+            if not todo:
+                continue
+            path = resolve_image_path({'filename': record.filename, 'image_path': record.image_path,
+                                       'batch_date': record.batch_date}, image_root)
+            if path is None:
+                missing += 1
+                continue
+            tasks.append((record.uuid, path, todo))
+
+        skipped = len(catalog) - len(tasks) - missing
+        print(f"📋 {len(tasks)} cars to analyse, {skipped} already done, {missing} without images")
+
+        started = time.perf_counter()
+        futures = {pool.submit(analyze_catalog_car, *task): task[0] for task in tasks}
+        completed = failed = 0
+        for future in as_completed(futures):
+            try:
+                uuid, fingerprint, entries = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"❌ {futures[future]}: {e}")
+                continue
+            for question, entry in entries.items():
+                store.put(uuid, question, fingerprint, entry)
+            completed += 1
+            if completed % 10 == 0 or completed == len(tasks):
+                rate = completed / (time.perf_counter() - started)
+                print(f"   {completed}/{len(tasks)} cars ({rate:.2f} cars/s)")
+
+    print(f"✅ Precomputed {completed} cars into {store_path} ({failed} failed, version {version[:12]})")
+    return completed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute catalog analyses for /analyze-nft")
+    parser.add_argument('--csv', default=os.getenv('CAR_CATALOG_PATH', DEFAULT_CSV_PATH))
+    parser.add_argument('--image-root', default=os.getenv('CAR_IMAGE_ROOT', DEFAULT_IMAGE_ROOT))
+    parser.add_argument('--store', default=os.getenv('PRECOMPUTED_STORE_PATH', DEFAULT_STORE_PATH))
+    parser.add_argument('--question', action='append', dest='questions',
+                        help=f"Question to precompute (repeatable, default: '{DEFAULT_QUESTION}')")
+    parser.add_argument('--workers', type=int, default=2, help="Worker processes (each loads both models)")
+    args = parser.parse_args()
+
+    precompute(args.csv, args.image_root, args.store, tuple(args.questions or [DEFAULT_QUESTION]), args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Precomputed Analysis Store
+SQLite table of full analyses (catalog info, BLIP caption, chat answer) for
+catalog cars, written by precompute_analyses.py and served from memory
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set
+
+DEFAULT_STORE_PATH = 'precomputed_analyses.sqlite3'
+DEFAULT_QUESTION = "Tell me about this car"
+
+
+def normalize_question(question: Optional[str]) -> str:
+    """Case- and whitespace-insensitive key for a user question"""
+    return " ".join((question or DEFAULT_QUESTION).split()).casefold()
+
+
+class PrecomputedStore:
+    """Results keyed by (uuid, question) for one model version, indexed by image fingerprint"""
+
+    def __init__(self, version: str, db_path: str = DEFAULT_STORE_PATH):
+        self.version = version
+        self.db_path = db_path
+        self._by_uuid = {}
+        self._by_fingerprint = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS precomputed_analyses (
+                uuid TEXT NOT NULL,
+                question TEXT NOT NULL,
+                version TEXT NOT NULL,
+                fingerprint TEXT,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (uuid, question, version)
+            )
+        """)
+        # Analyses from other model versions would not match live inference
+        self._conn.execute("DELETE FROM precomputed_analyses WHERE version != ?", (self.version,))
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        return len(self._by_uuid)
+
+    def load(self, current_car_info: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None) -> int:
+        """Read every row for this version into the in-memory indexes. With current_car_info
+        (uuid -> catalog car_info), rows whose car no longer matches the catalog are left out."""
+        by_uuid, by_fingerprint = {}, {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT uuid, question, fingerprint, value FROM precomputed_analyses WHERE version = ?",
+                (self.version,)
+            ).fetchall()
+        for uuid, question, fingerprint, value in rows:
+            entry = json.loads(value)
+            if current_car_info is not None and entry.get("car_info") != current_car_info(uuid):
+                continue
+            by_uuid[(uuid.upper(), question)] = entry
+            if fingerprint:
+                by_fingerprint[(fingerprint, question)] = entry
+        self._by_uuid, self._by_fingerprint = by_uuid, by_fingerprint
+        return len(by_uuid)
+
+    def put(self, uuid: str, question: str, fingerprint: Optional[str], entry: Dict[str, Any]):
+        """Persist one analysis; committed immediately so an interrupted job can resume"""
+        question = normalize_question(question)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO precomputed_analyses "
+                "(uuid, question, version, fingerprint, value, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (uuid, question, self.version, fingerprint, json.dumps(entry), time.time())
+            )
+            self._conn.commit()
+
+    def completed(self, question: str) -> Set[str]:
+        """UUIDs already analysed for a question at this version"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT uuid FROM precomputed_analyses WHERE version = ? AND question = ?",
+                (self.version, normalize_question(question))
+            ).fetchall()
+        return {uuid for (uuid,) in rows}
+
+    def _lookup(self, index: Dict, key) -> Optional[Dict[str, Any]]:
+        entry = index.get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def get(self, uuid: Optional[str], question: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not uuid:
+            return None
+        return self._lookup(self._by_uuid, (uuid.upper(), normalize_question(question)))
+
+    def get_by_fingerprint(self, fingerprint: str, question: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self._lookup(self._by_fingerprint, (fingerprint, normalize_question(question)))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "version": self.version,
+            "entries": len(self._by_uuid),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0
+        }
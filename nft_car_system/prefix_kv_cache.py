@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Prompt-Prefix KV Cache for the Car Chat Model
+Keeps past_key_values for the per-car "Car Info" prefix so each chat call only
+encodes the user-question suffix; bounded by memory with LRU eviction
+"""
+
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+import torch
+
+
+def _cache_nbytes(past_key_values) -> int:
+    """Approximate resident size of a KV cache (legacy tuples or Cache objects)"""
+    if hasattr(past_key_values, 'to_legacy_cache'):
+        past_key_values = past_key_values.to_legacy_cache()
+    total = 0
+    stack = [past_key_values]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, torch.Tensor):
+            total += item.element_size() * item.nelement()
+        elif isinstance(item, (tuple, list)):
+            stack.extend(item)
+    return total
+
+
+class PrefixKVCache:
+    """LRU of (prefix input_ids, past_key_values) keyed by (car key, model version)"""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max(0, max_bytes)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._builds = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def get_or_build(self, key: Tuple[str, str], prefix_ids: torch.Tensor, model) -> Tuple[torch.Tensor, Any]:
+        """Return (prefix_ids, a private copy of the prefix KV cache)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and torch.equal(entry[0], prefix_ids):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], copy.deepcopy(entry[1])
+            self.misses += 1
+            build_lock = self._builds.setdefault(key, threading.Lock())
+
+        # One thread encodes a given prefix; others wait and reuse it
+        with build_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None or not torch.equal(entry[0], prefix_ids):
+                with torch.no_grad():
+                    past_key_values = model(prefix_ids, use_cache=True).past_key_values
+                size = _cache_nbytes(past_key_values)
+                entry = (prefix_ids, past_key_values, size)
+                with self._lock:
+                    old = self._entries.pop(key, None)
+                    if old is not None:
+                        self._bytes -= old[2]
+                    if size <= self.max_bytes:
+                        self._entries[key] = entry
+                        self._bytes += size
+                        self._evict()
+            with self._lock:
+                self._builds.pop(key, None)
+        return entry[0], copy.deepcopy(entry[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Copy-on-Write Prefork Server for the ML API
+Loads the catalog and models once in a parent process, then forks uvicorn
+workers that share the read-only weight pages instead of each loading a copy
+
+Fork safety: libgomp/MKL thread pools and Python threads do not survive fork.
+The parent therefore warms up single-threaded (no intra-op pool is created)
+and stops the BLIP batcher and chat engine threads before forking; each
+worker sets its own thread count and starts fresh scheduler threads.
+ONNX Runtime sessions create their thread pools when loaded, so serve
+BLIP_BACKEND=onnx with uvicorn --workers rather than prefork.
+
+Usage: python prefork_server.py --workers 4 --port 8000
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+
+import torch
+
+import ml_api_service as service
+
+
+def load_parent():
+    """Load and warm everything workers will share, leaving no threads behind for fork"""
+    # One intra-op thread: warmup then never starts an OpenMP pool that a forked child would deadlock on
+    torch.set_num_threads(1)
+    count = service.car_catalog.load()
+    print(f"✅ Car catalog loaded ({count} cars)")
+    service.load_models()
+    service.models_ready.set()
+    # Scheduler threads are restarted in each worker by reinit_after_fork
+    if service.blip_batcher is not None:
+        service.blip_batcher.stop()
+    if service.car_chat_engine is not None:
+        service.car_chat_engine.stop()
+    # Park every loaded object in the permanent generation so GC passes in
+    # the workers do not write to (and so un-share) the parent's pages
+    gc.collect()
+    gc.freeze()
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, threads: int):
+    """Serve the app on the shared socket inside a forked worker"""
+    import uvicorn
+
+    torch.set_num_threads(threads)
+    service.reinit_after_fork()
+    server = uvicorn.Server(uvicorn.Config(service.app, log_level="info"))
+    server.run(sockets=[sock])
+
+
+def spawn_worker(sock: socket.socket, threads: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 0
+        try:
+            run_worker(sock, threads)
+        except BaseException as e:
+            print(f"❌ Worker {os.getpid()} failed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    print(f"👷 Worker {pid} started")
+    return pid
+
+
+def serve(host: str = "0.0.0.0", port: int = 8000, workers: int = 2, threads: int = 0):
+    """Load once, fork workers and restart any that die"""
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    print(f"🚀 Starting NFT Car ML API ({workers} prefork workers, {threads} threads each)...")
+    load_parent()
+    sock = bind_socket(host, port)
+    children = {spawn_worker(sock, threads) for _ in range(workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"⚠️ Worker {pid} exited with status {status}, restarting")
+            children.add(spawn_worker(sock, threads))
+    sock.close()
+    print("👋 All workers stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the ML API from forked workers sharing model weights")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', '2')))
+    parser.add_argument('--threads', type=int, default=0, help="torch threads per worker (default: cpus / workers)")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.threads)
+
+
+if __name__ == "__main__":
+    main()
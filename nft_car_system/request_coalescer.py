@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Singleflight Request Coalescing
+Concurrent requests with the same key attach to one in-flight computation
+and all receive its result (or its exception)
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class RequestCoalescer:
+    """Per-event-loop singleflight keyed by request content"""
+
+    def __init__(self):
+        self._in_flight = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Await fn() once per key; returns (result, shared) where shared is True for followers"""
+        task = self._in_flight.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.executed += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shield so one client disconnecting does not cancel the work for the others
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.executed + self.coalesced
+        return {
+            "in_flight": len(self._in_flight),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "dedupe_ratio": self.coalesced / total if total else 0.0
+        }
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Admission test: a full continuous batch must answer 503, not queue unboundedly
+Fills the chat engine past max_batch + max_queue with its scheduler stopped,
+then sends /analyze-nft for a known token and expects Service busy
+"""
+
+import os
+
+os.environ.setdefault('CHAT_ENGINE_MAX_BATCH', '2')
+os.environ.setdefault('CHAT_ENGINE_MAX_QUEUE', '2')
+
+from fastapi.testclient import TestClient
+
+import ml_api_service as service
+from inference_executor import ExecutorSaturated
+from token_index import TokenIndex, token_key
+
+COLLECTION = "0x0000000000000000000000000000000000000001"
+
+
+def test_chat_engine_admission():
+    """Submit until the engine refuses, then expect a 503 from the service"""
+    print("🚗 Loading car chat model...")
+    service.car_catalog.load()
+    service.load_chat_model()
+    engine = service.car_chat_engine
+    assert engine is not None, "Continuous batching is off"
+
+    # With the scheduler stopped nothing leaves the batch or the queue
+    engine.stop()
+    prompt = service.car_chat_tokenizer.encode("User: What is this car?\nAssistant:", return_tensors="pt")
+    admitted = []
+    try:
+        while len(admitted) <= engine.max_batch_size + engine.max_queue:
+            admitted.append(engine.submit(prompt, 4))
+    except ExecutorSaturated:
+        pass
+    assert len(admitted) == engine.max_batch_size + engine.max_queue, \
+        f"Engine admitted {len(admitted)} sequences, expected {engine.max_batch_size + engine.max_queue}"
+
+    # A known token goes straight to chat, so only the engine's admission is in play
+    record = next(record for record in service.car_catalog.records() if record.uuid)
+    service.token_index = TokenIndex({token_key(COLLECTION, "1"): record.uuid})
+    service.models_ready.set()
+    client = TestClient(service.app)
+    response = client.post("/analyze-nft", json={
+        "token_id": "1", "collection_address": COLLECTION, "user_message": "Tell me about this car"
+    })
+    print(f"📊 {response.status_code}: {response.json()} | engine: {engine.stats()}")
+    assert response.status_code == 503, f"Expected 503 from a full chat batch, got {response.status_code}"
+    assert engine.stats()["rejected"] >= 2
+
+    for future in admitted:
+        future.cancel()
+    print("✅ A full continuous batch is rejected with 503")
+
+
+if __name__ == "__main__":
+    test_chat_engine_admission()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Parity test: ONNX Runtime BLIP captions must match the torch backend
+Captions every catalog image found on disk with both backends, and compares
+caption latency of torch, ONNX without the KV cache and ONNX with it
+"""
+
+import os
+import time
+
+import torch
+from PIL import Image
+from transformers import BlipProcessor, BlipForConditionalGeneration
+
+from blip_onnx import OnnxBlipCaptioner, export_blip_onnx, BLIP_MODEL_NAME, DEFAULT_ONNX_DIR, DECODER_WITH_PAST_FILE
+from car_catalog import CarCatalog
+from car_embedding_index import resolve_image_path, DEFAULT_IMAGE_ROOT
+from image_preprocess import prepare_image
+
+
+def load_backends():
+    """BLIP processor, torch model and an ONNX captioner (exporting with the KV cache if needed)"""
+    onnx_dir = os.getenv('BLIP_ONNX_DIR', DEFAULT_ONNX_DIR)
+
+    print("🚗 Loading BLIP...")
+    processor = BlipProcessor.from_pretrained(BLIP_MODEL_NAME)
+    model = BlipForConditionalGeneration.from_pretrained(BLIP_MODEL_NAME)
+    model.eval()
+
+    if not os.path.exists(os.path.join(onnx_dir, DECODER_WITH_PAST_FILE)):
+        print(f"🔄 No KV-cache ONNX export in {onnx_dir}, exporting...")
+        export_blip_onnx(onnx_dir, model, processor)
+    return processor, model, OnnxBlipCaptioner(processor, model.config.text_config, onnx_dir)
+
+
+def catalog_images():
+    """Catalog images found on disk, decoded at model input size"""
+    image_root = os.getenv('CAR_IMAGE_ROOT', DEFAULT_IMAGE_ROOT)
+    catalog = CarCatalog()
+    catalog.load()
+
+    images = []
+    for record in catalog.records():
+        path = resolve_image_path({'filename': record.filename, 'image_path': record.image_path,
+                                   'batch_date': record.batch_date}, image_root)
+        if path is not None:
+            images.append((record.filename, prepare_image(Image.open(path), max_pixels=0)))
+    assert images, f"No catalog images found under {image_root}"
+    return images
+
+
+def test_onnx_parity():
+    """Compare torch and ONNX captions over the catalog"""
+    processor, model, captioner = load_backends()
+
+    checked, mismatches = 0, []
+    for filename, image in catalog_images():
+        inputs = processor(image.convert('RGB'), return_tensors="pt")
+        with torch.no_grad():
+            out = model.generate(**inputs, max_length=50)
+        torch_caption = processor.decode(out[0], skip_special_tokens=True)
+        onnx_caption = captioner.caption([image])[0]
+
+        checked += 1
+        if torch_caption != onnx_caption:
+            mismatches.append((filename, torch_caption, onnx_caption))
+            print(f"❌ {filename}\n   torch: {torch_caption}\n   onnx : {onnx_caption}")
+
+    print(f"\n📊 {checked - len(mismatches)}/{checked} captions match")
+    assert not mismatches, f"ONNX backend differs from torch on {len(mismatches)} images"
+    print("✅ ONNX backend matches torch on the catalog")
+
+
+def test_onnx_kv_cache_latency(num_images: int = 20):
+    """Caption latency of torch, ONNX recomputing every step, and ONNX reusing the KV cache"""
+    processor, model, captioner = load_backends()
+    images = [image for _, image in catalog_images()[:num_images]]
+
+    def torch_caption(image):
+        inputs = processor(image.convert('RGB'), return_tensors="pt")
+        with torch.no_grad():
+            return processor.decode(model.generate(**inputs, max_length=50)[0], skip_special_tokens=True)
+
+    backends = {
+        'torch': torch_caption,
+        'onnx (no cache)': lambda image: captioner.caption([image], use_cache=False)[0],
+        'onnx (kv cache)': lambda image: captioner.caption([image], use_cache=True)[0]
+    }
+    latencies, captions = {}, {}
+    for name, caption in backends.items():
+        caption(images[0])  # warmup
+        started = time.perf_counter()
+        captions[name] = [caption(image) for image in images]
+        latencies[name] = 1000.0 * (time.perf_counter() - started) / len(images)
+
+    print(f"\n📊 Caption latency over {len(images)} images:")
+    for name, latency in latencies.items():
+        print(f"   {name:16s} {latency:8.1f} ms/image")
+    print(f"   KV cache speedup over recompute: {latencies['onnx (no cache)'] / latencies['onnx (kv cache)']:.2f}x")
+    assert captions['onnx (kv cache)'] == captions['onnx (no cache)'], "KV cache changed ONNX captions"
+
+
+if __name__ == "__main__":
+    test_onnx_parity()
+    test_onnx_kv_cache_latency()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tier Latency Estimates for Graceful Degradation
+Tracks an exponentially weighted moving average of how long each pipeline
+tier (catalog, caption, chat) takes, so a request only starts a tier that is
+expected to finish within the time it has left
+"""
+
+import threading
+from typing import Any, Dict
+
+TIERS = ('catalog', 'caption', 'chat')
+
+# Conservative starting points (seconds) until real requests have been observed
+DEFAULT_PRIORS = {'catalog': 0.1, 'caption': 1.0, 'chat': 4.0}
+
+
+class TierLatency:
+    """EWMA of each tier's duration with a safety margin"""
+
+    def __init__(self, priors: Dict[str, float] = None, alpha: float = 0.2, headroom: float = 1.2,
+                 skip_decay: float = 0.95):
+        self.alpha = alpha
+        self.headroom = headroom
+        self.skip_decay = skip_decay
+        self._averages = dict(priors or DEFAULT_PRIORS)
+        self._observations = {tier: 0 for tier in self._averages}
+        self._lock = threading.Lock()
+
+    def observe(self, tier: str, seconds: float):
+        with self._lock:
+            count = self._observations.get(tier, 0)
+            # The first real measurement replaces the prior outright
+            previous = self._averages.get(tier) if count else None
+            self._averages[tier] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+            self._observations[tier] = count + 1
+
+    def skipped(self, tier: str):
+        """Shrink the estimate a little on every skip so a tier that is only
+        skipped (and so never measured) is eventually tried again"""
+        with self._lock:
+            if tier in self._averages:
+                self._averages[tier] *= self.skip_decay
+
+    def estimate(self, tier: str) -> float:
+        with self._lock:
+            return self._averages.get(tier, 0.0) * self.headroom
+
+    def fits(self, tier: str, remaining: float) -> bool:
+        """Whether the tier is expected to finish in the remaining seconds"""
+        return remaining >= self.estimate(tier)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                tier: {"avg_ms": 1000.0 * average, "observations": self._observations.get(tier, 0)}
+                for tier, average in self._averages.items()
+            }
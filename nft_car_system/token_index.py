@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Token-ID Index
+Maps (collection_address, token_id) to a catalog UUID so known tokens skip
+image decoding and recognition. Built offline from the PILOT database
+(carmania_nfts, surfing_woodie_editions) and the batch UUID mapping TSVs
+"""
+
+import csv
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from car_catalog import CarCatalog, DEFAULT_CSV_PATH
+
+DEFAULT_TOKEN_INDEX_PATH = 'token_index.json'
+DEFAULT_MAPPING_TSVS = ('batch1-uuid-mapping.tsv', 'batch2_uuid_mapping.tsv')
+
+
+def token_key(collection_address: str, token_id) -> Tuple[str, str]:
+    """Addresses are case-insensitive hex; token ids compare as decimal strings"""
+    return (collection_address or '').strip().lower(), str(token_id).strip()
+
+
+class TokenIndex:
+    """Hash map from token to catalog UUID with a hit counter"""
+
+    def __init__(self, entries: Dict[Tuple[str, str], str]):
+        self.entries = dict(entries)
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_TOKEN_INDEX_PATH) -> 'TokenIndex':
+        """Load an index written by save()"""
+        with open(path) as f:
+            rows = json.load(f)
+        return cls({token_key(row['collection_address'], row['token_id']): row['uuid'] for row in rows})
+
+    def save(self, path: str = DEFAULT_TOKEN_INDEX_PATH):
+        rows = [
+            {"collection_address": address, "token_id": token_id, "uuid": uuid}
+            for (address, token_id), uuid in sorted(self.entries.items())
+        ]
+        with open(path, 'w') as f:
+            json.dump(rows, f, indent=1)
+
+    def lookup(self, collection_address: str, token_id) -> Optional[str]:
+        uuid = self.entries.get(token_key(collection_address, token_id))
+        with self._lock:
+            self.lookups += 1
+            if uuid is not None:
+                self.hits += 1
+        return uuid
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "entries": len(self),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0
+            }
+
+
+def load_uuid_mappings(paths) -> Dict[str, str]:
+    """Filename -> UUID from the batch mapping TSVs ("File name", "UUID" columns)"""
+    mapping = {}
+    for path in paths:
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f, delimiter='\t'):
+                filename = (row.get('File name') or '').strip()
+                uuid = (row.get('UUID') or '').strip()
+                if filename and uuid:
+                    mapping[filename.lower()] = uuid
+    return mapping
+
+
+PILOT_TOKEN_QUERIES = (
+    ("carmania_nfts", """
+        SELECT cn.contract_address, cn.token_id, si.image_name
+        FROM carmania_nfts cn
+        JOIN surfing_woodie_images si ON si.id = cn.image_id
+    """),
+    # Editions have no token_id column; they are addressed by their Manifold id
+    ("surfing_woodie_editions", """
+        SELECT contract_address, manifold_id, filename
+        FROM surfing_woodie_editions
+        WHERE manifold_id IS NOT NULL
+    """),
+)
+
+
+def fetch_pilot_tokens(db_service) -> List[Tuple[str, str, str]]:
+    """(contract_address, token_id, filename) for every token in the PILOT database"""
+    tokens = []
+    for table, query in PILOT_TOKEN_QUERIES:
+        try:
+            with db_service.connection.cursor() as cursor:
+                cursor.execute(query)
+                tokens.extend(cursor.fetchall())
+        except Exception as e:
+            print(f"⚠️ Could not read {table}: {e}")
+            db_service.connection.rollback()
+    return tokens
+
+
+def build_index(tsv_paths=DEFAULT_MAPPING_TSVS, csv_path: str = DEFAULT_CSV_PATH, db_service=None) -> TokenIndex:
+    """Resolve every PILOT token's image filename to a catalog UUID"""
+    if db_service is None:
+        from pilot_database_service import PilotDatabaseService
+        db_service = PilotDatabaseService()
+        if not db_service.connect():
+            raise RuntimeError("PILOT database unavailable")
+
+    by_filename = load_uuid_mappings(tsv_paths)
+    catalog = CarCatalog(csv_path)
+    catalog.load()
+
+    entries, unresolved = {}, 0
+    for address, token_id, filename in fetch_pilot_tokens(db_service):
+        filename = (filename or '').strip()
+        uuid = by_filename.get(filename.lower())
+        if uuid is None:
+            record = catalog.get_by_filename(filename)
+            uuid = record.uuid if record is not None else None
+        if not uuid:
+            unresolved += 1
+            print(f"⚠️ No UUID for token {token_id} ({filename}), skipping")
+            continue
+        entries[token_key(address, token_id)] = uuid
+
+    print(f"✅ Indexed {len(entries)} tokens ({unresolved} unresolved)")
+    return TokenIndex(entries)
+
+
+def main():
+    """Build the token index offline"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the (collection, token_id) -> UUID index")
+    parser.add_argument('--tsv', action='append', dest='tsvs', help="UUID mapping TSV (repeatable)")
+    parser.add_argument('--csv', default=DEFAULT_CSV_PATH)
+    parser.add_argument('--output', default=DEFAULT_TOKEN_INDEX_PATH)
+    args = parser.parse_args()
+
+    print("🚗 Building token index...")
+    index = build_index(tuple(args.tsvs or DEFAULT_MAPPING_TSVS), args.csv)
+    index.save(args.output)
+    print(f"💾 Saved {len(index)} tokens to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Per-Worker Memory Report: uvicorn --workers vs copy-on-write prefork
+Starts each serving mode on localhost, waits until every worker is ready,
+optionally sends some traffic, then reads RSS/PSS from /proc (Linux only)
+"""
+
+import argparse
+import base64
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+SMAPS_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def process_memory(pid: int) -> dict:
+    """RSS/PSS breakdown of one process in MB, from /proc/<pid>/smaps_rollup"""
+    memory = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in SMAPS_FIELDS:
+                memory[key.lower() + '_mb'] = int(rest.split()[0]) / 1024.0
+    return memory
+
+
+def child_pids(pid: int):
+    """Direct children of pid (excluding multiprocessing helper processes)"""
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            with open(f'/proc/{entry}/cmdline', 'rb') as f:
+                cmdline = f.read()
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid and b'resource_tracker' not in cmdline:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def wait_until_ready(base_url: str, workers: int, timeout: float) -> bool:
+    """Wait for /ready to answer 200 many times in a row so every worker has loaded"""
+    deadline = time.time() + timeout
+    streak = 0
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/ready", timeout=5) as response:
+                streak = streak + 1 if response.status == 200 else 0
+        except Exception:
+            streak = 0
+        if streak >= workers * 4:
+            return True
+        time.sleep(0.5 if streak == 0 else 0.05)
+    return False
+
+
+def send_traffic(base_url: str, image_path: str, count: int):
+    """Exercise the full pipeline so copy-on-write effects of real requests show up"""
+    with open(image_path, 'rb') as f:
+        payload = json.dumps({
+            "image_base64": base64.b64encode(f.read()).decode(),
+            "token_id": "memory-report",
+            "collection_address": "0x0",
+            "user_message": "Tell me about this car"
+        }).encode()
+    for _ in range(count):
+        request = urllib.request.Request(f"{base_url}/analyze-nft", data=payload,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            urllib.request.urlopen(request, timeout=300).read()
+        except Exception as e:
+            print(f"⚠️ Request failed: {e}")
+
+
+def measure(name: str, command, workers: int, port: int, image_path: str = None,
+            requests_per_worker: int = 0, timeout: float = 900.0) -> dict:
+    """Run one serving mode and report memory for the parent and each worker"""
+    print(f"\n🚀 {name}: {' '.join(command)}")
+    process = subprocess.Popen(command, start_new_session=True)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        started = time.perf_counter()
+        if not wait_until_ready(base_url, workers, timeout):
+            raise RuntimeError(f"{name} did not become ready within {timeout:.0f}s")
+        ready_s = time.perf_counter() - started
+        if image_path and requests_per_worker:
+            send_traffic(base_url, image_path, requests_per_worker * workers)
+        time.sleep(2)
+
+        processes = {"parent": process_memory(process.pid)}
+        for pid in child_pids(process.pid):
+            processes[f"worker-{pid}"] = process_memory(pid)
+        worker_rows = [memory for key, memory in processes.items() if key != "parent"]
+        return {
+            "mode": name,
+            "workers": len(worker_rows),
+            "ready_s": ready_s,
+            "processes": processes,
+            "total_rss_mb": sum(memory.get('rss_mb', 0.0) for memory in processes.values()),
+            "total_pss_mb": sum(memory.get('pss_mb', 0.0) for memory in processes.values()),
+            "avg_worker_pss_mb": (sum(memory.get('pss_mb', 0.0) for memory in worker_rows) / len(worker_rows)
+                                  if worker_rows else 0.0)
+        }
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+
+
+def print_report(result: dict):
+    print(f"\n📊 {result['mode']} ({result['workers']} workers, ready in {result['ready_s']:.1f}s)")
+    print(f"   {'process':<16} {'RSS MB':>9} {'PSS MB':>9} {'shared MB':>10} {'private MB':>11}")
+    for key, memory in result["processes"].items():
+        shared = memory.get('shared_clean_mb', 0.0) + memory.get('shared_dirty_mb', 0.0)
+        private = memory.get('private_clean_mb', 0.0) + memory.get('private_dirty_mb', 0.0)
+        print(f"   {key:<16} {memory.get('rss_mb', 0.0):>9.1f} {memory.get('pss_mb', 0.0):>9.1f} "
+              f"{shared:>10.1f} {private:>11.1f}")
+    print(f"   {'total':<16} {result['total_rss_mb']:>9.1f} {result['total_pss_mb']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-worker RSS/PSS of uvicorn --workers and prefork")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--image', help="Image to send through /analyze-nft before measuring")
+    parser.add_argument('--requests-per-worker', type=int, default=5)
+    parser.add_argument('--output', default='worker_memory_report.json')
+    args = parser.parse_args()
+
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        sys.exit("❌ /proc/<pid>/smaps_rollup is required (Linux 4.14+)")
+
+    modes = [
+        ("uvicorn --workers", [sys.executable, '-m', 'uvicorn', 'ml_api_service:app',
+                               '--port', str(args.port), '--workers', str(args.workers)]),
+        ("prefork", [sys.executable, 'prefork_server.py', '--port', str(args.port),
+                     '--workers', str(args.workers)])
+    ]
+    results = []
+    for name, command in modes:
+        result = measure(name, command, args.workers, args.port, args.image, args.requests_per_worker)
+        print_report(result)
+        results.append(result)
+
+    before, after = results
+    print(f"\n💾 Total PSS {before['total_pss_mb']:.0f} MB → {after['total_pss_mb']:.0f} MB; "
+          f"per worker {before['avg_worker_pss_mb']:.0f} MB → {after['avg_worker_pss_mb']:.0f} MB")
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()